@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+"""
+Microbenchmark for the file_hub stack: measures the cost of a hit on the
+bare file_stack (push of a file that is already open), of a hit through the
+file hub (checkout / checkin, including locking) and of a miss that evicts the
+least recently used file for different maximum numbers of open files.
+Files are not actually opened (a dummy file method is used), such that only
+the bookkeeping of the stack is measured. The cost per operation should not
+depend on max_open_files.
+
+Usage (from the repository root or with irisreader installed):
+    python -m benchmarks.file_hub_bench [n_operations]
+"""
+
+import sys
+import time
+import random
+
+import irisreader as ir
+from irisreader.file_hub import file_hub, file_stack
+
+# dummy file handle that can be closed
+class dummy_handle:
+    def close( self ):
+        pass
+    def __len__( self ):
+        return 0
+
+# dummy file method that does not touch the disk
+def dummy_file_method( path ):
+    return dummy_handle()
+
+# function to measure the mean time per operation in microseconds
+def time_per_operation( operation, paths ):
+    start = time.perf_counter()
+    for path in paths:
+        operation( path )
+    return ( time.perf_counter() - start ) / len( paths ) * 1e6
+
+# function to benchmark hits and misses for a given stack size
+def benchmark( max_open_files, n_operations ):
+    ir.config.max_open_files = max_open_files
+    hub = file_hub( dummy_file_method )
+
+    stack = file_stack( dummy_file_method, max_size=max_open_files )
+
+    # fill the stacks
+    paths = [ "/data/file_{}.fits".format( i ) for i in range( max_open_files ) ]
+    for path in paths:
+        stack.push( path )
+        hub.checkout( path )
+        hub.checkin( path )
+    hit_paths = [ random.choice( paths ) for i in range( n_operations ) ]
+
+    # hits on the bare stack: lookup and recency refresh
+    stack_hit_time = time_per_operation( stack.push, hit_paths )
+
+    # hits: random files that are on the stack
+    def hit( path ):
+        hub.checkout( path )
+        hub.checkin( path )
+    hit_time = time_per_operation( hit, hit_paths )
+
+    # misses: new files that evict the least recently used file
+    new_paths = [ "/data/new_file_{}.fits".format( i ) for i in range( n_operations ) ]
+    miss_time = time_per_operation( hit, new_paths )
+
+    return stack_hit_time, hit_time, miss_time
+
+if __name__ == "__main__":
+
+    n_operations = int( sys.argv[1] ) if len( sys.argv ) > 1 else 100000
+    verbosity_level, max_open_files = ir.config.verbosity_level, ir.config.max_open_files
+    ir.config.verbosity_level = 0
+
+    print( "{:>15}\t{:>15}\t{:>12}\t{:>12}".format( "max_open_files", "stack hit [us]", "hit [us]", "miss [us]" ) )
+    for size in [ 16, 256, 4096 ]:
+        stack_hit_time, hit_time, miss_time = benchmark( size, n_operations )
+        print( "{:>15}\t{:>15.2f}\t{:>12.2f}\t{:>12.2f}".format( size, stack_hit_time, hit_time, miss_time ) )
+
+    ir.config.verbosity_level, ir.config.max_open_files = verbosity_level, max_open_files
@@ -1,4 +1,5 @@
 from irisreader.file_hub import file_hub, ASTROPY_FILE_METHOD
+from irisreader.frame_cache import frame_cache
 from irisreader.iris_data_cube import iris_data_cube
 from irisreader.raster_cube import raster_cube
 from irisreader.sji_cube import sji_cube
@@ -15,6 +16,9 @@ config = config_template()
 # instantiate file hub object and make it global
 file_hub = file_hub( ASTROPY_FILE_METHOD )
 
+# instantiate frame cache object and make it global
+frame_cache = frame_cache()
+
 # format for warnings
 import warnings
 def warning_format(message, category, filename, lineno, file=None, line=None):
@@ -253,7 +253,8 @@ class hek_data:
             YCENIX coordinate of IRIS at the time of the flare
         """
         n = int( np.round( self._caller_cube.n_steps * (flare_date-self.start_date) / (self.end_date-self.start_date) ) )
-        return [self._caller_cube.time_specific_headers[n]['XCENIX'], self._caller_cube.time_specific_headers[n]['YCENIX']]
+        columns = self._caller_cube._get_time_specific_columns( [n], keys=['XCENIX', 'YCENIX'] )
+        return [columns['XCENIX'][0], columns['YCENIX'][0]]
 
 
 
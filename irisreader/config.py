@@ -33,13 +33,90 @@ class config_template:
         
         False: load data into memory (default)
         
+    verify_files : str
+        Sets whether FITS files are verified (and fixed) with astropy's verify('fix') when they are opened:
+        
+        'always': verify every time a file is opened, also when the file hub reopens an evicted file (default)
+        
+        'once': verify a file once per fingerprint (path, size and modification time) and open it 
+        without verification afterwards if nothing had to be fixed (files that needed fixes are 
+        verified on every open)
+        
+        'never': never verify files (fastest, headers that do not conform to the standard are not fixed)
+        
     max_open_files : int
         Sets maximum number of open files:
         Some rasters have > 6000 files and irisreader may reach the open files limit of the host system when opening all at once.
         For this reason, the file_hub class abstracts file access and allows to limit the number of open files.
+        Files that are checked out by a reader (e.g. by another thread) are never closed, so this limit can 
+        temporarily be exceeded while all open files are in use.
         
         Default: 256
         
+    valid_steps_workers : int
+        Number of workers that scan files for valid image steps when a data cube is opened
+        for the first time (or with force_valid_steps=True). Files are scanned concurrently 
+        and the results are merged in file order, so the outcome is identical to the serial scan.
+        
+        Default: 1 (serial scan)
+        
+    valid_steps_pool : str
+        Type of pool used for the valid steps scan if valid_steps_workers > 1:
+        
+        'thread': thread pool (default)
+        
+        'process': process pool (workers see the configuration of the parent only if processes are forked)
+        
+    valid_steps_cache : str
+        Where the valid image steps of data cubes are cached:
+        
+        'npy': in a file .valid_steps_<line>_<keep_null>.npz next to the FITS files, together with
+        the size and modification time of every file (default)
+        
+        'sqlite': in one central SQLite index at valid_steps_db_path that is keyed on the path, 
+        size and modification time of every file. This index can be shared by many jobs and 
+        also works for read-only archives.
+        
+        None: valid steps are not cached
+        
+        The statistics of iris_data_cube.get_statistics are cached in the same place 
+        (.statistics_<line>_<keep_null>.npz next to the FITS files or in the directory 
+        'statistics' next to the SQLite index).
+        
+    valid_steps_db_path : str
+        Path to the SQLite index used if valid_steps_cache = 'sqlite'
+        
+        Default: ~/.irisreader/valid_steps.sqlite
+        
+    header_cache_dir : str
+        Directory of the on-disk header cache. If it is set, the time-specific header
+        columns of every file are stored there in a binary columnar format (one .npy 
+        file per FITS file, keyed on its path, size and modification time) the first time 
+        they are read. Later sessions read these columns instead of decoding the 
+        FITS table extensions again.
+        
+        Default: None (no header cache)
+        
+    prefetch_steps : int
+        Number of image steps that get_image_step reads ahead on a background thread once
+        it detects that image steps are requested sequentially (e.g. when animating or 
+        cropping). Reading ahead also opens the next raster files in the background, which
+        hides the latency of network storage. At most twice this number of frames is kept 
+        in memory per data cube.
+        
+        Default: 0 (no reading ahead)
+        
+    frame_cache_bytes : int
+        Byte budget of the frame cache (ir.frame_cache) that is shared by all data cubes.
+        If the budget is positive, get_image_step, get_image_steps and data cube indexing
+        read single frames through the section interface and keep them in this cache, 
+        evicting the least recently used frames once the budget is exceeded. The data of
+        a file is then never loaded into memory completely, such that the memory used for
+        image data is bounded by this budget even if use_memmap = False.
+        Hits, misses and evictions can be inspected with print(ir.frame_cache).
+        
+        Default: 0 (no frame cache)
+        
     mirrors : list
         Available data mirrors for downloading observations.
     
@@ -66,7 +143,15 @@ class config_template:
     # set default configuration    
     verbosity_level = 1
     use_memmap = False
+    verify_files = 'always'
     max_open_files = 256
+    valid_steps_workers = 1
+    valid_steps_pool = 'thread'
+    valid_steps_cache = 'npy'
+    valid_steps_db_path = "~/.irisreader/valid_steps.sqlite"
+    header_cache_dir = None
+    prefetch_steps = 0
+    frame_cache_bytes = 0
     mirrors = {
         'lmsal': 'http://www.lmsal.com/solarsoft/irisa/data/level2_compressed/', 
         'uio': 'http://sdc.uio.no/vol/fits/iris/level2/', 
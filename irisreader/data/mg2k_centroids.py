@@ -8,6 +8,7 @@ from sklearn.neighbors import NearestCentroid
 from scipy.interpolate import interp1d
 
 from irisreader.utils import date
+from irisreader.preprocessing import spectrum_interpolator
 
 DATA_PATH = pkg_resources.resource_filename( 'irisreader', 'data/' )
 
@@ -162,16 +163,41 @@ def interpolate( raster, step, bins=216, lambda_min=LAMBDA_MIN, lambda_max=LAMBD
         numpy vector with shape (X.shape[1],)
     """
     
+    return interpolate_images( raster, [step], [raster.get_image_step( step )], bins=bins, lambda_min=lambda_min, lambda_max=lambda_max )[0]
+
+def interpolate_images( raster, steps, images, bins=216, lambda_min=LAMBDA_MIN, lambda_max=LAMBDA_MAX ):
+    """
+    Returns interpolated images for image steps of the raster that have 
+    already been read (e.g. with raster.iter_chunks). A single interpolator
+    is used for all images.
+    
+    Parameters
+    ----------
+    raster : irisreader.raster_cube
+        raster_cube instance
+    steps : list
+        image steps in the raster
+    images : list / numpy.ndarray
+        images of the image steps, format [step,y,wavelength]
+    bins : int
+        number of bins to interpolate to (defaults to 216)
+    lambda_min : float
+        wavelength value where interpolation should start
+    lambda_max : float
+        wavelength value where interpolation should stop
+        
+    Returns
+    -------
+    list
+        list with an interpolated image of shape (y,bins) for every step
+    """
+    
     # make sure we are dealing with a Mg II - raster
     if not "Mg II k" in raster.line_info:
         raise ValueError("This is not a Mg II k raster!")
     
-    return raster.get_interpolated_image_step( 
-        step = step, 
-        lambda_min = lambda_min, 
-        lambda_max = lambda_max, 
-        n_breaks = bins 
-    )
+    interpolator = spectrum_interpolator( lambda_min, lambda_max, bins )
+    return [ interpolator.fit_transform( image, raster.get_axis_coordinates( step )[0] ) for step, image in zip( steps, images ) ]
 
 def get_mg2k_centroid_table( obs, centroids=None, lambda_min=LAMBDA_MIN, lambda_max=LAMBDA_MAX, crop_raster=False ):
     """
@@ -232,29 +258,33 @@ def get_mg2k_centroid_table( obs, centroids=None, lambda_min=LAMBDA_MIN, lambda_
     # empty data frame for centroid counts
     df = pd.DataFrame( columns=["full_obsid", "date", "image_no", "goes_flux", "centroid", "count"] )
     
+    # observation dates of all images
+    dates = raster.get_header_column( 'DATE_OBS' )
+    
     # assign centroids for each image and create aggregated data frame
-    for step in range( raster.n_steps ):
+    # (images are read in chunks of steps, such that every file is read only once)
+    for steps, images, _ in raster.iter_chunks( with_headers=False ):
+        for step, img in zip( steps, interpolate_images( raster, steps, images, bins=bins, lambda_min=lambda_min, lambda_max=lambda_max ) ):
 
-        # fetch assigned centroids            
-        img = interpolate( raster, step, bins=bins, lambda_min=lambda_min, lambda_max=lambda_max )
-        img_assigned_centroids = assign_mg2k_centroids( img, centroids=centroids )
-        assigned_centroids.append( img_assigned_centroids )
-        
-        # count centroids
-        recovered_centroids, counts = np.unique( img_assigned_centroids, return_counts=True )
-        
-        # append to data frame
-        df = df.append( 
-                pd.DataFrame(
-                        {'full_obsid': obs.full_obsid, 
-                         'date': date.from_Tformat( raster.headers[step]['DATE_OBS'] ), 
-                         'image_no': step, 
-                         'goes_flux': goes_flux[step],
-                         'centroid': recovered_centroids, 
-                         'count': counts }
-                        ),
-                sort = False
-            )
+            # fetch assigned centroids            
+            img_assigned_centroids = assign_mg2k_centroids( img, centroids=centroids )
+            assigned_centroids.append( img_assigned_centroids )
+            
+            # count centroids
+            recovered_centroids, counts = np.unique( img_assigned_centroids, return_counts=True )
+            
+            # append to data frame
+            df = df.append( 
+                    pd.DataFrame(
+                            {'full_obsid': obs.full_obsid, 
+                             'date': date.from_Tformat( dates[step] ), 
+                             'image_no': step, 
+                             'goes_flux': goes_flux[step],
+                             'centroid': recovered_centroids, 
+                             'count': counts }
+                            ),
+                    sort = False
+                )
     
     # create pivot table
     df = df.pivot_table(index=['full_obsid', 'date', 'image_no', 'goes_flux'], columns='centroid', values='count', aggfunc='first', fill_value=0 )
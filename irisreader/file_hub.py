@@ -2,8 +2,9 @@
 
 """
 file_hub class: 
-Manages access to FITS files with a stack, making sure that the open file limit
-of the host system is never reached.
+Manages access to FITS files with a least recently used stack, making sure that
+the open file limit of the host system is never reached. Access is thread-safe
+and handles that are checked out by a reader are never evicted.
 """
 
 # file method to open fits files
@@ -15,15 +16,55 @@ import irisreader as ir
 # handler for warnings
 import warnings
 
+# ordered dictionaries for the least recently used logic of the stack
+from collections import OrderedDict
+
+# locking and fork handling for concurrent readers
+import os
+import threading
+from contextlib import contextmanager
+
+# fingerprints of files for the verification policy
+from irisreader.utils.valid_steps_cache import file_fingerprint
+
+# fingerprints of files that were verified without anything to fix (for ir.config.verify_files = 'once')
+_verified_fingerprints = set()
+_verified_lock = threading.Lock()
+
 def ASTROPY_FILE_METHOD( path ):
     """
     Astropy method to open a FITS file.
-    This method is controlled through ir.config
+    This method is controlled through ir.config: use_memmap and verify_files
+    (whether the file is verified and fixed always, once per file fingerprint
+    or never).
     """
     handle = fits.open( path, memmap=ir.config.use_memmap )
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        handle.verify('fix')
+    
+    if ir.config.verify_files == 'never':
+        return handle
+    elif ir.config.verify_files == 'always':
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            handle.verify('fix')
+    elif ir.config.verify_files == 'once':
+        
+        # skip the verification if this version of the file has already been verified and nothing had to be fixed
+        fingerprint = file_fingerprint( path )
+        with _verified_lock:
+            if fingerprint in _verified_fingerprints:
+                return handle
+        
+        # verify explicitly instead of recording warnings (the warnings filters are shared by all threads):
+        # files that have to be fixed are verified again on every open (the fixes are not stored)
+        try:
+            handle.verify('exception')
+        except fits.VerifyError:
+            handle.verify('silentfix')
+        else:
+            with _verified_lock:
+                _verified_fingerprints.add( fingerprint )
+    else:
+        raise ValueError( "ir.config.verify_files should be either 'always', 'once' or 'never'" )
         
     return handle
 
@@ -32,34 +73,55 @@ class file_stack:
     """
     Class that models a file stack with special features for the problem at hand.
     Only intended for use by file_hub.
+    
+    Volatile and persistent files are kept in two separate ordered dictionaries
+    (path -> handle) that are ordered from least to most recently used. This
+    allows to look up, refresh and evict handles in constant time, independent
+    of the maximum number of open files.
+    
+    Every item carries a reference count: items that are currently checked out
+    (reference count > 0) are never evicted. The stack itself is not locked, 
+    synchronization is done by file_hub.
     """
     
     def __init__( self, file_method, max_size ):
         
-        # stack variables
-        self._paths = []
-        self._handles = []
-        self._modes = []
+        # stack variables: one LRU-ordered dictionary per mode and reference counts
+        self._layers = { 'volatile': OrderedDict(), 'persistent': OrderedDict() }
+        self._refcounts = {}
         
         # properties
         self.max_size = max_size
         self._file_method = file_method
         
-    def get_by_index( self, idx ):
+    def _find_mode( self, path ):
+        """
+        Returns the mode of the given path or None if it is not on the stack.
+        """
+        for mode in self._layers:
+            if path in self._layers[mode]:
+                return mode
+        return None
+    
+    def get( self, path ):
         """
-        Gets an object from the stack by index.
+        Gets an object from the stack by path (without changing its recency).
         
         Parameters
         ----------
-        idx : int
-            stack index
+        path : str
+            file path
         
         Returns
         -------
         dict :
             layer of the stack with file information: path, handle and mode
+            (None if the path is not on the stack)
         """
-        return  { 'path': self._paths[idx], 'handle': self._handles[idx], 'mode': self._modes[idx] }
+        mode = self._find_mode( path )
+        if mode is None:
+            return None
+        return { 'path': path, 'handle': self._layers[mode][path], 'mode': mode }
     
     def push( self, path, mode="volatile" ):
         """
@@ -83,86 +145,144 @@ class file_stack:
             raise ValueError( "Please specify a valid mode, either 'persistent' or 'volatile'" )
         
         # object is already on the stack: return it
-        if path in self._paths:
+        current_mode = self._find_mode( path )
+        if current_mode is not None:
             if ir.config.verbosity_level >= 3: print( "[file hub] item is already on stack" )
-            idx = self._paths.index( path )
             
-            # mode might have changed, update it
-            self._modes[ idx ] = mode
+            # mode might have changed, update it and mark item as most recently used
+            handle = self._layers[ current_mode ].pop( path )
+            self._layers[ mode ][ path ] = handle
             
             # return item from the stack
-            return self.get_by_index( idx )
+            return { 'path': path, 'handle': handle, 'mode': mode }
             
         # object is not yet on the stack: open file and put it there
         else:
             
-            # drop the oldest item from the stack if maximum size reached
-            if len( self._paths ) >= self.max_size:
+            # drop the least recently used item from the stack if maximum size reached
+            if self.size() >= self.max_size:
                 self.drop()
             
             # open file handle and catch too many files errors
             handle = self._file_method( path )
             
             if ir.config.verbosity_level >= 3: print( "[file hub] opening and pushing {} to stack".format( path ) )           
-            self._paths.append( path )
-            self._handles.append( handle )
-            self._modes.append( mode )
-            
-            # return the item (last on stack)
-            return self.get_by_index( -1 )
+            return self.insert( path, handle, mode )
 
-    
-    def drop_by_idx( self, idx ):
+    def insert( self, path, handle, mode="volatile" ):
         """
-        Drops an item from the stack by index.
+        Inserts an already opened handle as the most recently used item
+        (makes room if the maximum size is reached).
         
         Parameters
         ----------
-        idx : int
-            stack index
+        path : str
+            file path
+        handle : astropy.io.fits.HDUList
+            open file handle
+        mode : str
+            open mode: volatile (default) or persistent
+            
+        Returns
+        -------
+        dict :
+            layer of the stack with information on the file: path, handle and mode
+        """
+        
+        # drop the least recently used item from the stack if maximum size reached
+        if self.size() >= self.max_size:
+            self.drop()
+        
+        self._layers[ mode ][ path ] = handle
+        self._refcounts[ path ] = 0
+        
+        # return the item (most recently used)
+        return { 'path': path, 'handle': handle, 'mode': mode }
+    
+    def acquire( self, path ):
+        """Increments the reference count of an item on the stack"""
+        self._refcounts[ path ] += 1
+    
+    def release( self, path ):
+        """
+        Decrements the reference count of an item on the stack.
+        
+        Returns
+        -------
+        int :
+            remaining reference count (0 if the path is not on the stack)
         """
+        if path not in self._refcounts:
+            return 0
+        self._refcounts[ path ] = max( self._refcounts[ path ] - 1, 0 )
+        return self._refcounts[ path ]
+    
+    def in_use( self, path ):
+        """Returns True if the given item is currently checked out"""
+        return self._refcounts.get( path, 0 ) > 0
 
-        if ir.config.verbosity_level >= 3: print( "[file hub] dropping {} from stack".format( self._paths[idx] ) )
+    def _drop_item( self, mode, path ):
+        """
+        Closes a file and drops it from the given layer of the stack.
         
-        # close file
-        self._handles[idx].close()
+        Parameters
+        ----------
+        mode : str
+            layer of the stack: volatile or persistent
+        path : str
+            file path
+        """
+
+        if ir.config.verbosity_level >= 3: print( "[file hub] dropping {} from stack".format( path ) )
         
-        # remove file from stack
-        del self._paths[idx]
-        del self._handles[idx]
-        del self._modes[idx]    
+        # remove file from stack and close it
+        del self._refcounts[ path ]
+        self._layers[ mode ].pop( path ).close()
+    
+    def _least_recently_used( self, mode ):
+        """
+        Returns the least recently used path of the given layer that is not in use
+        (None if all items are in use).
+        """
+        for path in self._layers[ mode ]:
+            if not self.in_use( path ):
+                return path
+        return None
             
     def drop( self, path=None ):
         """
-        Drops an item from the stack: pops the oldest non-persistent if file path not specified.
+        Drops an item from the stack: pops the least recently used non-persistent if file path not specified.
         
         Parameters
         ----------
         path : str
-            Path to a file to drop (defaults to None: pop oldest non-persistent file)
+            Path to a file to drop (defaults to None: pop least recently used non-persistent file)
         """
         
-        # remove the oldest file from the stack
+        # remove the least recently used file from the stack
         if path is None:
         
-            # find the oldest item that is not persistent and drop it
-            dropped_item = False
-            for i in range( len( self._paths ) ):
-                if self._modes[i] == 'volatile':
-                    self.drop_by_idx( i )
-                    dropped_item = True
-                    break
-        
-            # if no item could be dropped, dropped the oldest persistent one and raise warning
-            if dropped_item == False:
-                self.drop_by_idx( 0 )              
+            # drop the least recently used item that is neither persistent nor in use
+            volatile_path = self._least_recently_used( 'volatile' )
+            if volatile_path is not None:
+                self._drop_item( 'volatile', volatile_path )
+                return
+        
+            # if no item could be dropped, dropped the least recently used persistent one and raise warning
+            persistent_path = self._least_recently_used( 'persistent' )
+            if persistent_path is not None:
+                self._drop_item( 'persistent', persistent_path )
                 warnings.warn( "Stack is full of persistent files, dropping the oldest persistent file. You might want to change your file handling strategy." )
+            
+            # all files are checked out: the stack temporarily grows beyond its maximum size
+            elif ir.config.verbosity_level >= 2:
+                print( "[file hub] all files on the stack are in use, not dropping any" )
         
         # remove a particular file from the stack
         else:
-            if path in self._paths:
-                idx = self._paths.index( path )
-                self.drop_by_idx( idx )
+            mode = self._find_mode( path )
+            if mode is not None:
+                self._drop_item( mode, path )
             
     def reset( self ):
         """
@@ -170,13 +290,13 @@ class file_stack:
         """
         
         # close all files
-        for i in range( len( self._handles ) ):
-            self._handles[i].close()
+        for layer in self._layers.values():
+            for handle in layer.values():
+                handle.close()
         
         # reset stack variables
-        self._paths = []
-        self._handles = []
-        self._modes = []
+        self._layers = { 'volatile': OrderedDict(), 'persistent': OrderedDict() }
+        self._refcounts = {}
             
     def peek( self ):
         """
@@ -184,15 +304,16 @@ class file_stack:
         """
         peek_str = "{} open files (maximum is {})".format( self.size(), self.max_size )
         peek_str += "\n\n{:10}\t{}".format( "mode", "path" )
-        for i in range( len( self._paths ) ):
-            peek_str += "\n{:10}\t{}".format( self._modes[i], self._paths[i] ) 
+        for mode in self._layers:
+            for path in self._layers[mode]:
+                peek_str += "\n{:10}\t{}".format( mode, path ) 
             
         return peek_str
     
     
     def size( self ):
         """Returns the size of the stack"""
-        return len( self._paths )
+        return len( self._layers['volatile'] ) + len( self._layers['persistent'] )
 
 
 # file hub class that builds on file_stack
@@ -201,18 +322,44 @@ class file_hub:
     File Hub: Abstracts access to FITS files, thereby making sure that the maximum
     open files limit of the host system is not reached while keeping as much data
     as possible in memory.
+    
+    All operations are guarded by a lock, such that the file hub can be shared
+    by several threads. Readers that need a handle to stay open while they work
+    with it should use `checkout` / `checkin` (or the `checked_out` context 
+    manager): checked out handles are reference counted and never evicted.
+    After a fork, the child process starts with a fresh lock and an empty stack.
     """
     
     def __init__( self, file_method ):
         
         # stack of open files
+        self._file_method = file_method
         self._file_stack = file_stack( file_method, max_size=ir.config.max_open_files )
+        
+        # lock for concurrent access and files that have to be closed once they are returned
+        self._lock = threading.RLock()
+        self._pending_close = set()
+        
+        # handles and locks must not be shared with forked child processes
+        if hasattr( os, 'register_at_fork' ):
+            os.register_at_fork( after_in_child=self._reinit_after_fork )
+    
+    # reinitialize the file hub in a forked child process
+    def _reinit_after_fork( self ):
+        self._lock = threading.RLock()
+        self._pending_close = set()
+        self._file_stack = file_stack( self._file_method, max_size=ir.config.max_open_files )
 
     # open a file and push it to the stack
     def open( self, path, mode="volatile" ):
         """
         Open a file and push it to the stack.
         
+        The returned handle is not checked out: it may be evicted and closed
+        by any later call to the file hub (e.g. from another thread), so this
+        method is not thread-safe. Readers should use `checked_out` (or
+        `checkout` / `checkin`) instead.
+        
         Parameters
         ----------
         path : str
@@ -226,14 +373,90 @@ class file_hub:
             Handle to open file.
         """
         
-        # try to push path to stack and retrieve and return handle
-        item = self._file_stack.push( path, mode )
-        return item['handle']
+        # push path to stack and retrieve and return handle (without holding a reference)
+        handle = self.checkout( path, mode )
+        self.checkin( path )
+        return handle
+    
+    # open a file and hold a reference to it
+    def checkout( self, path, mode="volatile" ):
+        """
+        Open a file, push it to the stack and increment its reference count.
+        The handle is guaranteed to stay open until it is returned with `checkin`.
+        
+        Parameters
+        ----------
+        path : str
+            file path
+        mode : str
+            open mode: volatile (default) or persistent
+            
+        Returns
+        -------
+        astropy.io.fits.hdu :
+            Handle to open file.
+        """
+        
+        # file is already on the stack: refresh it and hold a reference
+        with self._lock:
+            if self._file_stack.get( path ) is not None:
+                item = self._file_stack.push( path, mode )
+                self._file_stack.acquire( path )
+                return item['handle']
+            
+        # open file outside the lock so that other threads are not blocked
+        handle = self._file_method( path )
+        
+        with self._lock:
+            # another thread might have opened the same file in the meantime
+            if self._file_stack.get( path ) is not None:
+                handle.close()
+                item = self._file_stack.push( path, mode )
+            else:
+                if ir.config.verbosity_level >= 3: print( "[file hub] opening and pushing {} to stack".format( path ) )
+                item = self._file_stack.insert( path, handle, mode )
+            
+            self._file_stack.acquire( path )
+            return item['handle']
+    
+    # return a checked out file
+    def checkin( self, path ):
+        """
+        Return a file that has been checked out with `checkout`.
+        
+        Parameters
+        ----------
+        path : str
+            file path
+        """
+        with self._lock:
+            if self._file_stack.release( path ) == 0 and path in self._pending_close:
+                self._close( path )
+    
+    # context manager for checkout / checkin
+    @contextmanager
+    def checked_out( self, path, mode="volatile" ):
+        """
+        Context manager that checks out a file and returns it on exit.
+        
+        Parameters
+        ----------
+        path : str
+            file path
+        mode : str
+            open mode: volatile (default) or persistent
+        """
+        handle = self.checkout( path, mode )
+        try:
+            yield handle
+        finally:
+            self.checkin( path )
     
     # close a file and drop it from the stack
     def close( self, path ):
         """
-        Close a file handle and remove the file from the stack.
+        Close a file handle and remove the file from the stack. If the file
+        is currently checked out, it is closed as soon as it is returned.
         
         Parameters
         ----------
@@ -241,28 +464,42 @@ class file_hub:
             file path
         """
         
+        with self._lock:
+            if self._file_stack.in_use( path ):
+                self._pending_close.add( path )
+            else:
+                self._close( path )
+    
+    # close a file that is not in use
+    def _close( self, path ):
+        self._pending_close.discard( path )
+        
         # manually delete data objects, otherwise memory mapping will keep file open
         # (http://docs.astropy.org/en/stable/io/fits/appendix/faq.html#id18)
-        if path in self._file_stack._paths:
-            idx = self._file_stack._paths.index( path )
-            for i in range( len( self._file_stack._handles[idx] ) ):
-                del self._file_stack._handles[idx][i].data
+        item = self._file_stack.get( path )
+        if item is not None:
+            for i in range( len( item['handle'] ) ):
+                del item['handle'][i].data
     
         # drop file from stack
         self._file_stack.drop( path )
         
     def reset( self ):
         """Resets the file hub"""
-        self._file_stack.reset()
-        self._file_stack.max_size = ir.config.max_open_files
+        with self._lock:
+            self._file_stack.reset()
+            self._file_stack.max_size = ir.config.max_open_files
+            self._pending_close = set()
         
     # display stack  
     def __repr__( self ):
-        return self._file_stack.peek()
+        with self._lock:
+            return self._file_stack.peek()
     
     # get number of open files
     def __len__( self ):
-        return self._file_stack.size()
+        with self._lock:
+            return self._file_stack.size()
         
 
 # MOVE TO TEST            
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+frame_cache class:
+Keeps decoded image frames in memory up to a byte budget (ir.config.frame_cache_bytes),
+evicting the least recently used frames first. The cache is shared by all data
+cubes, such that the memory used for image data can be bounded per process
+independently of the number of open cubes and files.
+"""
+
+# access to verbosity_level and the byte budget
+import irisreader as ir
+
+# ordered dictionaries for the least recently used logic
+from collections import OrderedDict
+
+# locking for concurrent readers
+import threading
+
+class frame_cache:
+    """
+    Least recently used cache for decoded image frames. Frames are keyed on
+    (path, extension, file step) and stored uncropped. Access is thread-safe.
+
+    The byte budget is read from ir.config.frame_cache_bytes on every insert,
+    setting it to 0 disables the cache. Hits, misses and evictions are counted
+    and can be inspected with stats() or print(ir.frame_cache).
+    """
+
+    def __init__( self ):
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # whether the cache is enabled in the configuration
+    @property
+    def enabled( self ):
+        return ir.config.frame_cache_bytes > 0
+
+    def get( self, key ):
+        """
+        Returns a frame from the cache and marks it as most recently used.
+
+        Parameters
+        ----------
+        key : tuple
+            (path, extension, file step)
+
+        Returns
+        -------
+        numpy.ndarray :
+            Cached frame or None if it is not cached.
+        """
+        with self._lock:
+            frame = self._frames.get( key )
+            if frame is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._frames.move_to_end( key )
+            return frame
+
+    def put( self, key, frame ):
+        """
+        Puts a frame into the cache and evicts least recently used frames
+        until the cache fits into the byte budget again. Frames that are larger
+        than the whole budget are not cached.
+
+        Parameters
+        ----------
+        key : tuple
+            (path, extension, file step)
+        frame : numpy.ndarray
+            Frame to cache (it should not be modified afterwards).
+        """
+        budget = ir.config.frame_cache_bytes
+        if frame.nbytes > budget:
+            return
+
+        with self._lock:
+            if key in self._frames:
+                self.nbytes -= self._frames.pop( key ).nbytes
+            self._frames[key] = frame
+            self.nbytes += frame.nbytes
+
+            while self.nbytes > budget:
+                _, evicted_frame = self._frames.popitem( last=False )
+                self.nbytes -= evicted_frame.nbytes
+                self.evictions += 1
+
+        if ir.config.verbosity_level >= 3: print("[frame cache] cached frame {} ({} bytes in use)".format( key, self.nbytes ) )
+
+    def drop( self, paths ):
+        """
+        Removes all frames of the given files from the cache.
+
+        Parameters
+        ----------
+        paths : list
+            Paths of the files
+        """
+        paths = set( paths )
+        with self._lock:
+            for key in [ key for key in self._frames if key[0] in paths ]:
+                self.nbytes -= self._frames.pop( key ).nbytes
+
+    def reset( self ):
+        """
+        Removes all frames from the cache and resets the counters.
+        """
+        with self._lock:
+            self._frames.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats( self ):
+        """
+        Returns the cache statistics.
+
+        Returns
+        -------
+        dict :
+            Number of cached frames, bytes in use, byte budget, hits, misses and evictions.
+        """
+        with self._lock:
+            return { 'frames': len( self._frames ), 'nbytes': self.nbytes, 'budget': ir.config.frame_cache_bytes,
+                     'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions }
+
+    def __repr__( self ):
+        stats = self.stats()
+        return "frame cache: {frames} frames, {nbytes} of {budget} bytes in use, {hits} hits, {misses} misses, {evictions} evictions".format( **stats )
+
+    def __len__( self ):
+        return len( self._frames )
@@ -3,11 +3,14 @@
 # import libraries
 import pandas as pd
 from irisreader import iris_data_cube, sji_cube, raster_cube
+from irisreader.utils.fits import read_headers, sji_line_description, CorruptFITSException
 
 def get_lines( file_object ):
     """
     Returns the available lines in a raster or SJI file. Both filenames and
-    open iris_data_cube objects are accepted.
+    open iris_data_cube objects are accepted. For filenames, only the primary
+    header (and the header of the first data extension for rasters) is read,
+    the data is never touched.
     
     Parameters
     ----------
@@ -23,17 +26,40 @@ def get_lines( file_object ):
     
     # check whether file_object is a filename or an already opened iris_data_cube object
     if isinstance( file_object, str ):
-        fits_data = iris_data_cube( file_object )
+        primary_headers = read_headers( file_object, n_headers=1 )[0]
+        
+        # check whether the INSTRUMENT header is either set to SJI or raster (as iris_data_cube does it)
+        if not primary_headers.get( 'INSTRUME' ) in ['SJI', 'SPEC']:
+            raise CorruptFITSException( "This is neither IRIS SJI nor raster! (according to the INSTRUME header)" )
+        
+        fits_type = 'sji' if primary_headers['INSTRUME'] == 'SJI' else 'raster'
+        
+        # cheap integrity checks from the headers: SJI store their data cube in the primary extension,
+        # rasters in the following extensions (the first one has to be present)
+        if fits_type == 'sji':
+            if primary_headers.get( 'NAXIS' ) == 2:
+                raise CorruptFITSException( "SJI: first extension has only two dimensions (single image, not implemented)" )
+            data_headers = [ primary_headers ]
+        else:
+            data_headers = read_headers( file_object, n_headers=2 )[1:]
+        
+        if len( data_headers ) == 0 or data_headers[0].get( 'NAXIS' ) != 3:
+            raise CorruptFITSException( "No data cubes found." )
+        
+        line_description = sji_line_description( primary_headers['TDESC1'] ) if fits_type == 'sji' else None
         
     elif isinstance( file_object, iris_data_cube ) or isinstance( file_object, sji_cube ) or isinstance( file_object, raster_cube ):
-        fits_data = file_object
+        fits_type = file_object.type
+        line_description = file_object.line_info
+        if fits_type == 'raster':
+            primary_headers = file_object.primary_headers
         
     else:
         raise ValueError("Please pass a either a filename or a valid iris_data_cube object.")
     
     
     # check whether the object is a raster or SJI and extract line info
-    if fits_data.type == 'sji':
+    if fits_type == 'sji':
 
         line_info = pd.DataFrame( {
                 'field': ['FUV1', 'FUV2', 'NUV', 'NUV'], 
@@ -41,17 +67,17 @@ def get_lines( file_object ):
                 'description': ['C II 1330', 'Si IV 1400', 'Mg II h/k 2796', 'Mg II wing 2832']
                 } )
     
-        line_info = line_info[line_info.description == fits_data.line_info].reset_index( drop=True )  
+        line_info = line_info[line_info.description == line_description].reset_index( drop=True )  
         line_info = line_info[['field', 'wavelength', 'description']] # make sure line info stays in the right format
     
-    elif fits_data.type == 'raster':
+    elif fits_type == 'raster':
     
-        wave_field_keys = [k for k in fits_data.primary_headers.keys() if k.startswith("TDET")]
-        wave_field_values = [fits_data.primary_headers[x] for x in sorted(wave_field_keys)]
-        wave_length_keys = [k for k in fits_data.primary_headers.keys() if k.startswith("TWAVE")]
-        wave_length_values = [round(fits_data.primary_headers[x],1) for x in sorted(wave_length_keys)]
-        wave_text_keys = [k for k in fits_data.primary_headers.keys() if k.startswith("TDESC")]
-        wave_text_values = [fits_data.primary_headers[x] for x in sorted(wave_text_keys)]
+        wave_field_keys = [k for k in primary_headers.keys() if k.startswith("TDET")]
+        wave_field_values = [primary_headers[x] for x in sorted(wave_field_keys)]
+        wave_length_keys = [k for k in primary_headers.keys() if k.startswith("TWAVE")]
+        wave_length_values = [round(primary_headers[x],1) for x in sorted(wave_length_keys)]
+        wave_text_keys = [k for k in primary_headers.keys() if k.startswith("TDESC")]
+        wave_text_values = [primary_headers[x] for x in sorted(wave_text_keys)]
 
         line_info = pd.DataFrame(
                 {'field': wave_field_values, 'wavelength': wave_length_values, 
@@ -59,11 +85,6 @@ def get_lines( file_object ):
                  columns=['field', 'wavelength', 'description']
         )
     
-    # close object again if a string was passed
-    if isinstance( file_object, str ):
-        fits_data.close()
-        
-    
     return line_info
 
 # MOVE TO TEST
@@ -53,7 +53,9 @@ def has_line( file_object, description ):
     """
     Returns True if the supplied raster or SJI contains the line in question 
     and False if not. If the line is ambiguously specified, an error will be
-    raised. Both filenames and open iris_data_cube objects are accepted.
+    raised. Both filenames and open iris_data_cube objects are accepted. For
+    filenames, only the primary header (and the header of the first data
+    extension for rasters) is read, the data is never touched.
     
     Parameters
     ----------
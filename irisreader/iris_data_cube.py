@@ -7,14 +7,21 @@ of auxiliary variables available
 
 import os
 import numpy as np
+import pandas as pd
 import warnings
-from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import irisreader as ir
-from irisreader.utils.fits import line2extension, array2dict, CorruptFITSException
-from irisreader.utils.date import from_Tformat, to_Tformat, to_epoch
+from irisreader.utils.fits import line2extension, sji_line_description, array2columns, get_null_frames, CorruptFITSException
+from irisreader.utils.date import from_Tformat, add_seconds, add_seconds_Tformat, to_epoch_array
 from irisreader.utils.coordinates import iris_coordinates
 from irisreader.utils import lazy_file_header_list
+from irisreader.utils.layered_header import header_layers, layered_header
+from irisreader.utils.valid_steps_cache import get_valid_steps_cache, make_entry
+from irisreader.utils.header_cache import get_header_cache
+from irisreader.utils.prefetcher import prefetcher
+from irisreader.utils.lazy_array import lazy_array
+from irisreader.utils.cube_statistics import compute_statistics, load_statistics, store_statistics, FRAME_STATISTICS, PIXEL_STATISTICS
 from irisreader.preprocessing import image_cube_cropper
 from irisreader.coalignment import goes_data
 
@@ -42,7 +49,8 @@ class iris_data_cube:
         data cube. This list is stored to the directory where the file resides
         and can then be loaded in the future instead of creating the list again.
         `force_valid_steps` forces iris_data_cube to create the list again even
-        if it's already stored.
+        if it's already stored. Files that changed or were added since the list
+        was stored are assessed again automatically.
         
     Attributes
     ----------
@@ -70,6 +78,9 @@ class iris_data_cube:
         Dictionary with primary headers of the FITS file (lazy loaded).
     time_specific_headers: dict
         List of dictionaries with time-specific headers of the selected line (lazy loaded).  
+    time_specific_table: pandas.DataFrame
+        Table with the time-specific headers of the selected line with one column
+        per key and one row per time step (lazy loaded).
     shape : tuple
         Shape of the data cube (this is affected by the keep_null argument)
     """
@@ -87,99 +98,101 @@ class iris_data_cube:
         self._keep_null = keep_null
         self._force_valid_steps = force_valid_steps
         
-        # request first file from filehub and get general info
-        first_file = ir.file_hub.open( files[0] )
+        # no prefetching until the first image step is requested
+        self._prefetcher = None
         
-        # check whether the INSTRUMENT header is either set to SJI or raster:
-        if 'INSTRUME' not in first_file[0].header.keys() or not first_file[0].header['INSTRUME'] in ['SJI', 'SPEC']:
-            raise CorruptFITSException( "This is neither IRIS SJI nor raster! (according to the INSTRUME header)" )
-        
-        # set FITS type
-        if first_file[0].header['INSTRUME'] == 'SJI':
-            self.type = 'sji' 
-        else:
-            self.type = 'raster'
-
-        # Check if data part of first extension has only two dimensions. 
-        # If yes, this is a SJI with only one single image. Currently such files
-        # cannot be handled, throw an error
-        if hasattr( first_file[0], 'shape' ) and len( first_file[0].shape ) == 2:
-            #first_file[0].data = np.array([first_file[0].data])
-            raise CorruptFITSException( "SJI: first extension has only two dimensions (single image, not implemented)" )
-            
-        # get extensions with data cubes in them
-        self._n_ext = len( first_file )
-        data_cube_extensions = []
-        for i in range( self._n_ext ):
-            if hasattr( first_file[i], 'shape' ) and len( first_file[i].shape ) == 3:
-                data_cube_extensions.append( i )
-       
-        if len( data_cube_extensions ) == 0:
-            raise CorruptFITSException( "No data cubes found." )
-        
-        self._first_data_ext = min( data_cube_extensions )
-        self._last_data_ext = max( data_cube_extensions )
-        
-        # find extension that contains selected line
-        if line == '':
-            self._selected_ext = self._first_data_ext # choose first line by default
-        elif line2extension( first_file[0].header, line ) != -1: 
-            self._selected_ext = line2extension( first_file[0].header, line )
-        else:
-            self.close()
-            raise CorruptFITSException(('Change the line parameter: The desired spectral window is either not found or specified ambiguously.'))
-        
-        # check the integrity of this first file
-        self._check_integrity( first_file )
-        
-        # set obsid
-        self.obsid = first_file[0].header['OBSID']
-        
-        # set date
-        self.start_date = first_file[0].header['STARTOBS']
-        self.end_date = first_file[0].header['ENDOBS']
+        # check out first file from filehub (protects it from eviction) and get general info
+        with ir.file_hub.checked_out( files[0] ) as first_file:
 
-        # set description
-        self.desc = first_file[0].header['OBS_DESC']
+            # check whether the INSTRUMENT header is either set to SJI or raster:
+            if 'INSTRUME' not in first_file[0].header.keys() or not first_file[0].header['INSTRUME'] in ['SJI', 'SPEC']:
+                raise CorruptFITSException( "This is neither IRIS SJI nor raster! (according to the INSTRUME header)" )
 
-        # get observation mode
-        if 'sit-and-stare' in self.desc:
-            self.mode = 'sit-and-stare'
-        else:
-            self.mode = 'n-step raster'
-
-        # set number of raster positions
-        self.n_raster_pos = first_file[0].header['NRASTERP']
-        
-        # number of files
-        self.n_files = len( self._files )
-            
-        # line information (SJI info is replaced by actual line information)
-        self.line_info = first_file[0].header['TDESC'+str(self._selected_ext-self._first_data_ext+1)]
-        self.line_info = self.line_info.replace( 'SJI_1330', 'C II 1330' )
-        self.line_info = self.line_info.replace( 'SJI_1400', 'Si IV 1400' )
-        self.line_info = self.line_info.replace( 'SJI_2796', 'Mg II h/k 2796' )
-        self.line_info = self.line_info.replace( 'SJI_2832', 'Mg II wing 2832' )
-        
-        # no cropping: set variables to none
-        self._xmin = None
-        self._xmax = None
-        self._ymin = None
-        self._ymax = None
-        self._cropped = False
-        
-        # set some variables that will be lazy loaded
-        self.shape = None
-        self._original_shape = None
-        self.n_steps = None
-        self._valid_steps = None
-        self.primary_headers = None
-        self.time_specific_headers = None
-        self.line_specific_headers = None
-        self.headers = None
-        
-        # initialize coordinate converter
-        self._ico = iris_coordinates( header=first_file[self._selected_ext].header, mode=self.type )
+            # set FITS type
+            if first_file[0].header['INSTRUME'] == 'SJI':
+                self.type = 'sji' 
+            else:
+                self.type = 'raster'
+
+            # Check if data part of first extension has only two dimensions. 
+            # If yes, this is a SJI with only one single image. Currently such files
+            # cannot be handled, throw an error
+            if hasattr( first_file[0], 'shape' ) and len( first_file[0].shape ) == 2:
+                #first_file[0].data = np.array([first_file[0].data])
+                raise CorruptFITSException( "SJI: first extension has only two dimensions (single image, not implemented)" )
+
+            # get extensions with data cubes in them
+            self._n_ext = len( first_file )
+            data_cube_extensions = []
+            for i in range( self._n_ext ):
+                if hasattr( first_file[i], 'shape' ) and len( first_file[i].shape ) == 3:
+                    data_cube_extensions.append( i )
+
+            if len( data_cube_extensions ) == 0:
+                raise CorruptFITSException( "No data cubes found." )
+
+            self._first_data_ext = min( data_cube_extensions )
+            self._last_data_ext = max( data_cube_extensions )
+
+            # find extension that contains selected line
+            if line == '':
+                self._selected_ext = self._first_data_ext # choose first line by default
+            elif line2extension( first_file[0].header, line ) != -1: 
+                self._selected_ext = line2extension( first_file[0].header, line )
+            else:
+                self.close()
+                raise CorruptFITSException(('Change the line parameter: The desired spectral window is either not found or specified ambiguously.'))
+
+            # check the integrity of this first file
+            self._check_integrity( first_file )
+
+            # set obsid
+            self.obsid = first_file[0].header['OBSID']
+
+            # set date
+            self.start_date = first_file[0].header['STARTOBS']
+            self.end_date = first_file[0].header['ENDOBS']
+
+            # set description
+            self.desc = first_file[0].header['OBS_DESC']
+
+            # get observation mode
+            if 'sit-and-stare' in self.desc:
+                self.mode = 'sit-and-stare'
+            else:
+                self.mode = 'n-step raster'
+
+            # set number of raster positions
+            self.n_raster_pos = first_file[0].header['NRASTERP']
+
+            # number of files
+            self.n_files = len( self._files )
+
+            # line information (SJI info is replaced by actual line information)
+            self.line_info = sji_line_description( first_file[0].header['TDESC'+str(self._selected_ext-self._first_data_ext+1)] )
+
+            # no cropping: set variables to none
+            self._xmin = None
+            self._xmax = None
+            self._ymin = None
+            self._ymax = None
+            self._cropped = False
+
+            # set some variables that will be lazy loaded
+            self.shape = None
+            self._original_shape = None
+            self.n_steps = None
+            self._valid_steps = None
+            self._raster_pos_index = None
+            self.primary_headers = None
+            self.time_specific_headers = None
+            self.time_specific_table = None
+            self._time_specific_columns = {}
+            self.line_specific_headers = None
+            self.headers = None
+
+            # initialize coordinate converter
+            self._ico = iris_coordinates( header=first_file[self._selected_ext].header, mode=self.type )
 
 
     # close all files
@@ -188,6 +201,12 @@ class iris_data_cube:
         Closes the FITS file(s)
         """
         
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+        
+        ir.frame_cache.drop( self._files )
+        
         for file in self._files:
             ir.file_hub.close( file )
     
@@ -211,6 +230,9 @@ class iris_data_cube:
         elif name=='time_specific_headers' and object.__getattribute__( self, "time_specific_headers" ) is None:
             self._prepare_time_specific_headers()
             return object.__getattribute__( self, "time_specific_headers" )
+        elif name=='time_specific_table' and object.__getattribute__( self, "time_specific_table" ) is None:
+            self._prepare_time_specific_table()
+            return object.__getattribute__( self, "time_specific_table" )
         elif name=='line_specific_headers' and object.__getattribute__( self, "line_specific_headers" ) is None:
             self._prepare_line_specific_headers()
             return object.__getattribute__( self, "line_specific_headers" )
@@ -225,10 +247,10 @@ class iris_data_cube:
         if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading valid image steps")
 
         valid_steps = []
+        last_shape = None
         
-        # generate the path to the file with the precomputed valid steps
-        keep_null_str = "keep_null" if self._keep_null else "discard_null"
-        valid_steps_file = "{}/.valid_steps_{}_{}.npy".format( os.path.dirname( self._files[0] ), self.line_info.replace(' ','_').replace('/','_'), keep_null_str )
+        # generate the identifier of the precomputed valid steps in the cache
+        cache_variant = self._get_cache_variant()
 
         # generate valid steps without looking into files if keep_null = True
         # Warning: this routine needs to be checked thoroughly - it's unclear how this works for bad data    
@@ -237,13 +259,13 @@ class iris_data_cube:
                 if ir.config.verbosity_level >= 2:
                     print("[iris_data_cube] Warning: Not testing for bad data if keep_null=True")
             
-                # open first file
-                f = ir.file_hub.open( self._files[ 0 ] ) # open first file to look up steps
+                # look up steps in the first file
+                with ir.file_hub.checked_out( self._files[ 0 ] ) as f:
+                    steps = f[0].shape[0] if self.type == 'sji' else f[1].shape[0]
                 
                 # n-step raster
                 if self.mode == "n-step raster":
                     if self.type == 'sji':
-                        steps = f[0].shape[0]
                         sweeps = int( steps / self.n_raster_pos )
                         
                         # raise error if sweeps is not an integer
@@ -263,91 +285,137 @@ class iris_data_cube:
                 
                 # sit-and-stare
                 else:
-                    if self.type == "sji":
-                        steps = f[0].shape[0]
-                    else:
-                        steps = f[1].shape[0]
-                        
                     valid_steps = np.zeros( [steps, 3] )
                     valid_steps[:,1] = np.arange( steps )
     
-        # valid steps have already been precomputed: try to load the file
-        elif not self._force_valid_steps and os.path.exists( valid_steps_file ):
-            if ir.config.verbosity_level >= 2: print("[iris_data_cube] using precomputed steps")
-            try:
-                valid_steps = np.load( valid_steps_file )
-        
-            except Exception as e:
-                print( e )
-
-        
-        # no precomputed valid image steps: assess them now
+        # load precomputed valid steps from the cache and assess the missing ones now
         else:
-            # go through all the files: make sure they are not corrupt with _check_integrity
-            for file_no in range( len( self._files ) ):
+            cache = get_valid_steps_cache()
+            if cache is not None and not self._force_valid_steps:
+                entries = cache.load( self._files, cache_variant )
+            else:
+                entries = [None] * len( self._files )
             
-                # request file from file hub
-                f = ir.file_hub.open( self._files[ file_no ] )
+            # files that the cache recorded as corrupt are discarded again
+            if ir.config.verbosity_level >= 1:
+                for file_no, entry in enumerate( entries ):
+                    if entry is not None and entry['error'] is not None:
+                        warnings.warn("File #{} is corrupt, discarding it ({}, cached result)".format( file_no, entry['error'] ) )
             
-                try:
-                    # make sure that file is not corrupt
-                    self._check_integrity( f )
+            # go through all the files that are not cached: make sure they are not corrupt with _check_integrity
+            # (optionally in parallel, results are merged in file order)
+            missing_file_numbers = [file_no for file_no in range( len( self._files ) ) if entries[file_no] is None]
+            if ir.config.valid_steps_workers > 1 and len( missing_file_numbers ) > 1:
+                if ir.config.valid_steps_pool == 'thread':
+                    executor = ThreadPoolExecutor
+                elif ir.config.valid_steps_pool == 'process':
+                    executor = ProcessPoolExecutor
+                else:
+                    raise ValueError( "ir.config.valid_steps_pool should be either 'thread' or 'process'" )
                 
-                    # check whether some images are -200 everywhere and if desired
-                    # (keep_null=False), do not label these images as valid
-                    for file_step in range( f[self._selected_ext].shape[0] ):
-                        
-                        # assign the raster position
-                        # raster: raster position is either file_step (n-step raster) or 0 everywhere (sit-and-stare)
-                        # sji: there is only one file, raster position is file_step modulo the number of raster positions
-                        if self.n_raster_pos == 1:
-                            raster_pos = 0
-                        else:
-                            if self.type == 'raster':
-                                raster_pos = file_step
-                            else:
-                                raster_pos = file_step % self.n_raster_pos
-                        
-                        # use the section or the data interface, depending on whether files are opened with memory mapping or not
-                        if ir.config.use_memmap:
-                            image_is_null = np.all( f[ self._selected_ext ].section[file_step,:,:] == -200 )
-                        else:
-                            image_is_null = np.all( f[ self._selected_ext ].data[file_step,:,:] == -200 )
-
-                        if self._keep_null or not image_is_null:
-                            valid_steps.append( [file_no, file_step, raster_pos] )
-                        
-                except CorruptFITSException as e:
-                    warnings.warn("File #{} is corrupt, discarding it ({})".format( file_no, e ) )
+                if ir.config.verbosity_level >= 2: print("[iris_data_cube] Scanning files with {} {} workers".format( ir.config.valid_steps_workers, ir.config.valid_steps_pool ) )
+                with executor( max_workers=ir.config.valid_steps_workers ) as pool:
+                    scanned_entries = list( pool.map( self._scan_file_valid_steps, missing_file_numbers ) )
+            else:
+                scanned_entries = map( self._scan_file_valid_steps, missing_file_numbers )
+            
+            for file_no, entry in zip( missing_file_numbers, scanned_entries ):
+                if entry['error'] is not None:
+                    warnings.warn("File #{} is corrupt, discarding it ({})".format( file_no, entry['error'] ) )
+                entries[file_no] = entry
             
             # store valid steps
-            try:
-                np.save( valid_steps_file, np.array( valid_steps ) )
-            except Exception as e:
-                print( e )
-        
-        
+            if cache is not None and len( missing_file_numbers ) > 0:
+                cache.store( self._files, cache_variant, entries )
+                
+            # merge the valid steps of all files
+            for file_no, entry in enumerate( entries ):
+                valid_steps.extend( [ [file_no] + row for row in entry['steps'].tolist() ] )
+            last_shape = entries[-1]['shape']
         
         # return an error if the data cube contains no valid steps    
         if len( valid_steps ) == 0:
             raise CorruptFITSException("This data cube contains no valid images!")
             
         # update class instance variables
-        self._valid_steps = np.array( valid_steps, dtype=np.int )
+        self._valid_steps = np.array( valid_steps, dtype=int )
         self.n_steps = len( valid_steps )
-        f = ir.file_hub.open( self._files[ -1 ] )
-        self.shape = tuple( [ self.n_steps ] + list( f[ self._selected_ext ].shape[1:] ) )
+        if last_shape is None:
+            with ir.file_hub.checked_out( self._files[ -1 ] ) as f:
+                last_shape = f[ self._selected_ext ].shape
+        self.shape = tuple( [ self.n_steps ] + list( last_shape[1:] ) )
         self._original_shape = self.shape
         
+    # function to get the identifier of the line and the null mode in caches
+    def _get_cache_variant( self ):
+        keep_null_str = "keep_null" if self._keep_null else "discard_null"
+        return "{}_{}".format( self.line_info.replace(' ','_').replace('/','_'), keep_null_str )
+        
+    # function to find the valid steps in a single file
+    def _scan_file_valid_steps( self, file_no ):
+        """
+        Checks the integrity of a single file and finds its valid image steps.
+        
+        Parameters
+        ----------
+        file_no : int
+            File number
+        
+        Returns
+        -------
+        dict :
+            valid steps cache entry: 'steps' ([file_step, raster_pos] rows), 'shape' (shape of 
+            the selected extension) and 'error' (error message or None if the file is not corrupt)
+        """
+        
+        file_valid_steps = []
+        
+        # request file from file hub
+        with ir.file_hub.checked_out( self._files[ file_no ] ) as f:
+            
+            shape = f[ self._selected_ext ].shape
+            try:
+                # make sure that file is not corrupt
+                self._check_integrity( f )
+            
+                # check whether some images are -200 everywhere and if desired
+                # (keep_null=False), do not label these images as valid
+                # (use the section or the data interface, depending on whether files are opened with memory mapping or not;
+                # with the frame cache, data is only read through the section interface such that a file is never loaded completely)
+                n_file_steps = f[self._selected_ext].shape[0]
+                if self._keep_null:
+                    is_valid = np.ones( n_file_steps, dtype=bool )
+                else:
+                    is_valid = ~get_null_frames( f[ self._selected_ext ], use_section=ir.config.use_memmap or ir.frame_cache.enabled )
+                file_steps = np.where( is_valid )[0]
+                    
+                # assign the raster position
+                # raster: raster position is either file_step (n-step raster) or 0 everywhere (sit-and-stare)
+                # sji: there is only one file, raster position is file_step modulo the number of raster positions
+                if self.n_raster_pos == 1:
+                    raster_pos = np.zeros_like( file_steps )
+                else:
+                    if self.type == 'raster':
+                        raster_pos = file_steps
+                    else:
+                        raster_pos = file_steps % self.n_raster_pos
+                
+                file_valid_steps = np.column_stack( [ file_steps, raster_pos ] )
+                    
+            except CorruptFITSException as e:
+                return make_entry( file_valid_steps, shape, str( e ) )
+        
+        return make_entry( file_valid_steps, shape )
+        
     # prepare primary headers
     def _prepare_primary_headers( self ):
         if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading primary headers")
         
-        # request first file from file hub
-        first_file = ir.file_hub.open( self._files[0] )
+        # request first file from file hub and convert headers to dictionary
+        with ir.file_hub.checked_out( self._files[0] ) as first_file:
+            self.primary_headers = dict( first_file[0].header )
         
-        # convert headers to dictionary and clean up some values
-        self.primary_headers = dict( first_file[0].header )
+        # clean up some values
         self.primary_headers['SAA'] = self.primary_headers['SAA'].strip() 
         self.primary_headers['NAXIS'] = 2
         self.primary_headers['HISTORY'] = str( self.primary_headers['HISTORY'] )
@@ -373,70 +441,108 @@ class iris_data_cube:
         if ir.config.verbosity_level >= 2: print("[iris_data_cube] Assigning lazy_file_header_list object to headers")
         self.headers = lazy_file_header_list( self._valid_steps[:,:2], self._load_combined_header_file )    
     
-    # function to load time-specific headers from a file    
-    def _load_time_specific_header_file( self, file_no ):
-        if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading time specific headers for file {}".format(file_no))
-
-        # request file from file hub
-        f = ir.file_hub.open( self._files[file_no] )
-         
-        # read headers from data array
-        file_time_specific_headers = array2dict( f[self._n_ext-2].header, f[self._n_ext-2].data )
-        
-        # apply some corrections to the individual headers
-        startobs = from_Tformat( self.primary_headers['STARTOBS'] )
-        for i in range( len( file_time_specific_headers ) ):
+    # prepare table with time-specific headers
+    def _prepare_time_specific_table( self ):
+        if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading time specific header table")
+        self.time_specific_table = pd.DataFrame( self._get_time_specific_columns( np.arange( self.n_steps ) ) )
+    
+    # function to get time-specific header columns (key -> numpy array) for the given time steps
+    def _get_time_specific_columns( self, steps, keys=None ):
+        file_steps = self._valid_steps[ steps, :2 ]
+        
+        # load the columns of all involved files and put the rows to their positions in the output
+        columns = {}
+        order = np.argsort( file_steps[:,0], kind='stable' )
+        file_numbers, first_positions = np.unique( file_steps[order,0], return_index=True )
+        for file_no, positions in zip( file_numbers, np.split( order, first_positions[1:] ) ):
+            file_columns = self._load_time_specific_header_columns( file_no )
+            for key in ( file_columns.keys() if keys is None else keys ):
+                if key not in columns:
+                    columns[key] = np.empty( len( file_steps ), dtype=file_columns[key].dtype )
+                columns[key][positions] = file_columns[key][ file_steps[positions,1] ]
+        
+        return columns
+    
+    # function to load time-specific headers from a file as columns (key -> numpy array)
+    def _load_time_specific_header_columns( self, file_no ):
+        if file_no in self._time_specific_columns:
+            return self._time_specific_columns[ file_no ]
         
-            # set a DATE_OBS header in each frame as DATE_OBS = STARTOBS + TIME
-            file_time_specific_headers[i]['DATE_OBS'] = to_Tformat( startobs + timedelta( seconds=file_time_specific_headers[i]['TIME'] ) )
+        if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading time specific header columns for file {}".format(file_no))
         
-            # if key 'DSRCNIX' exists: rename it to 'DSRCRCNIX'
-            if 'DSRCNIX' in file_time_specific_headers[i].keys():
-                file_time_specific_headers[i]['DSRCRCNIX'] = file_time_specific_headers[i].pop('DSRCNIX')
-                
-            # remove some keys (as IDL does it, currently disabled)
-            # for key_to_remove in ['PC1_1IX', 'PC1_2IX', 'PC2_1IX', 'PC2_2IX', 'PC2_3IX', 'PC3_1IX', 'PC3_2IX', 'PC3_3IX', 'OPHASEIX', 'OBS_VRIX']:
-            #     if key_to_remove in file_time_specific_headers[i].keys():
-            #        del file_time_specific_headers[i][ key_to_remove ]
+        # use the header columns from the cache if available, otherwise decode them from the file
+        cache = get_header_cache()
+        columns = None if cache is None else cache.load( self._files[file_no] )
+        if columns is None:
+            
+            # request file from file hub and read header columns from data array
+            with ir.file_hub.checked_out( self._files[file_no] ) as f:
+                columns = array2columns( f[self._n_ext-2].header, f[self._n_ext-2].data )
             
-        # return headers
-        return file_time_specific_headers
+            if cache is not None:
+                cache.store( self._files[file_no], columns )
+        
+        # set a DATE_OBS column as DATE_OBS = STARTOBS + TIME
+        columns['DATE_OBS'] = add_seconds_Tformat( self.primary_headers['STARTOBS'], columns['TIME'] )
+        
+        # if key 'DSRCNIX' exists: rename it to 'DSRCRCNIX'
+        if 'DSRCNIX' in columns:
+            columns['DSRCRCNIX'] = columns.pop('DSRCNIX')
+        
+        # remove some keys (as IDL does it, currently disabled)
+        # for key_to_remove in ['PC1_1IX', 'PC1_2IX', 'PC2_1IX', 'PC2_2IX', 'PC2_3IX', 'PC3_1IX', 'PC3_2IX', 'PC3_3IX', 'OPHASEIX', 'OBS_VRIX']:
+        #     columns.pop( key_to_remove, None )
+        
+        self._time_specific_columns[ file_no ] = columns
+        return columns
+    
+    # function to load time-specific headers from a file (one dictionary per image step, created from the columns)
+    def _load_time_specific_header_file( self, file_no ):
+        if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading time specific headers for file {}".format(file_no))
+        columns = self._load_time_specific_header_columns( file_no )
+        keys = list( columns.keys() )
+        return [ dict( zip( keys, row ) ) for row in zip( *columns.values() ) ]
 
-    # function to convert time-specific headers from a file to combined headers
+    # function to load combined headers of a file: read-only mappings that share the primary and line-specific headers
     def _load_combined_header_file( self, file_no ):
-        raise NotImplementedError( "This feature is not implemented in iris_data_cube, please use sji_cube or raster_cube" )
+        if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading combined headers for file {}".format(file_no))
+        
+        # the layers are shared by all frames of the file, every frame only stores its row in the time-specific header columns
+        columns = self._load_time_specific_header_columns( file_no )
+        layers = header_layers( columns, self._get_header_aliases(), self._get_constant_headers() )
+        return [ layered_header( layers, row ) for row in range( len( columns['TIME'] ) ) ]
          
     # prepare line specific headers
     def _prepare_line_specific_headers( self ):
         if ir.config.verbosity_level >= 2: print("[iris_data_cube] Lazy loading line specific headers")
         
         # request first file from file hub
-        first_file = ir.file_hub.open( self._files[0] )
+        with ir.file_hub.checked_out( self._files[0] ) as first_file:
+            primary_header = first_file[0].header
         
-        # get line-specific headers from data extension (if selected extension is not the first one)
-        if self._selected_ext > 0:
-            line_specific_headers = dict( first_file[ self._selected_ext ].header )
-        else:
-            line_specific_headers = {}
+            # get line-specific headers from data extension (if selected extension is not the first one)
+            if self._selected_ext > 0:
+                line_specific_headers = dict( first_file[ self._selected_ext ].header )
+            else:
+                line_specific_headers = {}
         
         # add wavelnth, wavename, wavemin and wavemax (without loading primary headers)
-        line_specific_headers['WAVELNTH'] = first_file[0].header['TWAVE'+str(self._selected_ext-self._first_data_ext+1)]
-        line_specific_headers['WAVENAME'] = first_file[0].header['TDESC'+str(self._selected_ext-self._first_data_ext+1)]
-        line_specific_headers['WAVEMIN'] =  first_file[0].header['TWMIN'+str(self._selected_ext-self._first_data_ext+1)]
-        line_specific_headers['WAVEMAX'] =  first_file[0].header['TWMAX'+str(self._selected_ext-self._first_data_ext+1)]
-        line_specific_headers['WAVEWIN'] =  first_file[0].header['TDET'+str(self._selected_ext-self._first_data_ext+1)]
+        line_specific_headers['WAVELNTH'] = primary_header['TWAVE'+str(self._selected_ext-self._first_data_ext+1)]
+        line_specific_headers['WAVENAME'] = primary_header['TDESC'+str(self._selected_ext-self._first_data_ext+1)]
+        line_specific_headers['WAVEMIN'] =  primary_header['TWMIN'+str(self._selected_ext-self._first_data_ext+1)]
+        line_specific_headers['WAVEMAX'] =  primary_header['TWMAX'+str(self._selected_ext-self._first_data_ext+1)]
+        line_specific_headers['WAVEWIN'] =  primary_header['TDET'+str(self._selected_ext-self._first_data_ext+1)]
 
         self.line_specific_headers = line_specific_headers
         
     # function to remove image steps from valid steps (e.g. by cropper)
     def _remove_steps( self, steps ):
     
-        # if steps is a single integer, put it into a list    
-        if not isinstance( steps, (list, tuple) ):
-            steps = [steps]
-    
-        # now remove the steps (make sure they are removed simultaneously)
-        valid_steps = np.delete( self._valid_steps, steps, axis=0 )
+        # mark the steps to remove in a boolean mask (make sure they are removed simultaneously)
+        steps = np.asarray( steps, dtype=int ).reshape(-1)
+        keep = np.ones( self.n_steps, dtype=bool )
+        keep[ steps ] = False
+        valid_steps = self._valid_steps[ keep ]
         
         # raise a warning if the data cube contains no valid steps    
         if len( valid_steps ) == 0:
@@ -444,13 +550,22 @@ class iris_data_cube:
         else:
             self._valid_steps = valid_steps
 
-        # remove steps from time-specific headers if already loaded
-        if not object.__getattribute__( self, "time_specific_headers" ) is None:
-            self.time_specific_headers = [ self.time_specific_headers[i] for i in range( self.n_steps ) if i not in steps ]
-        
-        # remove steps from headers if already loaded
-        if not object.__getattribute__( self, "headers" ) is None:
-            self.headers = [ self.headers[i] for i in range( self.n_steps ) if i not in steps ]
+        # the table with time-specific headers is recreated from the cached columns upon the next access
+        self.time_specific_table = None
+        
+        # update the raster position index: drop removed steps and renumber the remaining ones
+        if self._raster_pos_index is not None:
+            new_steps = np.cumsum( keep ) - 1
+            self._raster_pos_index = [ new_steps[ index[ keep[index] ] ] for index in self._raster_pos_index ]
+        
+        # remove steps from time-specific headers and headers if already loaded
+        # (lazy header lists only need the new valid steps, headers of files that are already loaded are kept)
+        for name in ['time_specific_headers', 'headers']:
+            header_list = object.__getattribute__( self, name )
+            if isinstance( header_list, lazy_file_header_list ):
+                header_list.set_valid_steps( self._valid_steps[:,:2] )
+            elif header_list is not None:
+                setattr( self, name, [ header for header, keep_header in zip( header_list, keep ) if keep_header ] )
             
         # update n_steps and shape
         self.n_steps = len( self._valid_steps )
@@ -462,7 +577,20 @@ class iris_data_cube:
         if raster_pos is None:
             return self._valid_steps[ step, : ]
         else:
-            return self._valid_steps[self._valid_steps[:,2]==raster_pos, :][ step, : ]
+            return self._valid_steps[ self._get_raster_pos_index( raster_pos )[ step ], : ]
+    
+    # function to get the global steps of a raster position (the index is built once for all raster positions)
+    def _get_raster_pos_index( self, raster_pos ):
+        if self._raster_pos_index is None:
+            raster_positions = self._valid_steps[:,2]
+            order = np.argsort( raster_positions, kind='stable' )
+            counts = np.bincount( raster_positions, minlength=self.n_raster_pos )
+            self._raster_pos_index = np.split( order, np.cumsum( counts )[:-1] )
+        
+        if raster_pos < len( self._raster_pos_index ):
+            return self._raster_pos_index[ raster_pos ]
+        else:
+            return np.array( [], dtype=int )
     
     # function to return valid steps in a file
     def _get_valid_steps( self, file_no ):
@@ -483,9 +611,33 @@ class iris_data_cube:
         abstract access to the cropped data. If keep_null=False, null images
         will automatically be removed from the representation.
         """
+        return self.get_data( index )
+    
+    # function to access the data cube, optionally writing into a buffer
+    def get_data( self, index, out=None ):
+        """
+        Returns the data selected by a three-dimensional index, exactly like 
+        data_cube[index]. If the image axes are indexed with integers or slices,
+        the output shape is computed up front and the data of all involved files
+        is written directly into one float32 output array (or into the buffer 
+        `out`). The output is always a copy of the file data.
+        
+        Parameters
+        ----------
+        index : tuple
+            Three-dimensional index [step, y, x] (SJI) or [step, y, wavelength] (raster).
+        out : numpy.ndarray
+            Optional buffer with the shape of the output to write the data to
+            (a ValueError is raised if the shape does not match).
+            
+        Returns
+        -------
+        numpy.ndarray
+            Selected data.
+        """
         
         # check dimensions - this rules out the ellisis (...) for the moment
-        if len( index ) != 3:
+        if not isinstance( index, tuple ) or len( index ) != 3:
             raise ValueError("This is a three-dimensional object, please index accordingly.")
 
         # get involved file numbers and steps
@@ -496,39 +648,129 @@ class iris_data_cube:
             valid_steps = self._valid_steps[ index[0], :2 ]
         
         # if image should be cropped make sure that slices stay slices (is about 30% faster)
-        if self._cropped:  
-            if isinstance( index[1], slice ):
-                a = self._ymin if index[1].start is None else index[1].start+self._ymin
-                b = self._ymax if index[1].stop is None else index[1].stop+self._ymin  
-                internal_index1 = slice( a, b, index[1].step )
-                
-            else:
-                internal_index1 = np.arange( self._ymin, self._ymax )[ index[1] ]
-                
-            if isinstance( index[2], slice ):
-                a = self._xmin if index[2].start is None else index[2].start+self._xmin
-                b = self._xmax if index[2].stop is None else index[2].stop+self._xmin  
-                internal_index2 = slice( a, b, index[2].step )
-                
-            else:
-                internal_index2 = np.arange( self._xmin, self._xmax )[ index[2] ]
-
+        if self._cropped:
+            internal_index1 = self._get_internal_index( index[1], self._ymin, self._ymax )
+            internal_index2 = self._get_internal_index( index[2], self._xmin, self._xmax )
         else:
             internal_index1 = index[1]
             internal_index2 = index[2]
-
-        # get all data slices and concatenate them (always use data interface here, regardless of whether memory mapping is used or not)
-        slices = []
-        for file_no in np.unique( valid_steps[:,0] ):
-            file = ir.file_hub.open( self._files[file_no] )
-            slices.append( file[ self._selected_ext ].data[ valid_steps[ valid_steps[:,0] == file_no, 1 ], internal_index1, internal_index2 ] )
-        slices = np.vstack( slices )
-
-        # remove first dimension if there is only one slice
-        if slices.shape[0] == 1 and slices.ndim == 3:
-           slices = slices[0,:,:]
             
-        return slices
+        file_numbers = np.unique( valid_steps[:,0] )
+        
+        # advanced indexing on the image axes: the output shape depends on numpy's
+        # broadcasting rules, collect data slices and concatenate them
+        if not all( isinstance( i, (slice, int, np.integer) ) for i in [internal_index1, internal_index2] ):
+            slices = []
+            for file_no in file_numbers:
+                slices.append( self._read_file_data( file_no, valid_steps[ valid_steps[:,0] == file_no, 1 ], internal_index1, internal_index2, as_slice=False ) )
+            slices = np.concatenate( slices ).astype( np.float32, copy=False )
+            
+            # remove first dimension if there is only one slice
+            if slices.shape[0] == 1 and slices.ndim == 3:
+               slices = slices[0,:,:]
+            
+            # copy to the output buffer if one was given
+            if out is not None:
+                if out.shape != slices.shape:
+                    raise ValueError( "The output buffer should have shape {}".format( slices.shape ) )
+                out[...] = slices
+                return out
+            
+            return slices
+        
+        # only integers and slices on the image axes: compute output shape up front
+        image_shape = self._original_shape[1:]
+        inner_shape = [ len( range( n )[ i ] ) for i, n in zip( [internal_index1, internal_index2], image_shape ) if isinstance( i, slice ) ]
+        shape = tuple( [ len( valid_steps ) ] + inner_shape )
+        
+        # the first dimension is removed if there is only one slice
+        out_shape = shape[1:] if shape[0] == 1 and len( shape ) == 3 else shape
+        if out is None:
+            out = np.empty( out_shape, dtype=np.float32 )
+        elif out.shape != out_shape:
+            raise ValueError( "The output buffer should have shape {}".format( out_shape ) )
+        slices = out if out.shape == shape else out[np.newaxis]
+        
+        # write file by file into the output array (the data is always copied, such
+        # that changes to the output never affect the file data)
+        position = 0
+        for file_no in file_numbers:
+            file_steps = valid_steps[ valid_steps[:,0] == file_no, 1 ]
+            slices[position:position+len( file_steps )] = self._read_file_data( file_no, file_steps, internal_index1, internal_index2 )
+            position += len( file_steps )
+            
+        return out
+    
+    # function to convert a (cropped) image index into an index of the uncropped data
+    @staticmethod
+    def _get_internal_index( index, lower, upper ):
+        n = upper - lower
+        
+        # slices: shift them into the cropped region
+        if isinstance( index, slice ):
+            r = range( n )[ index ]
+            stop = r.stop + lower
+            return slice( r.start + lower, stop if stop >= 0 else None, r.step )
+            
+        # integers: shift them into the cropped region
+        elif isinstance( index, (int, np.integer) ):
+            if index < -n or index >= n:
+                raise IndexError( "index {} is out of bounds for axis with size {}".format( index, n ) )
+            return lower + index % n
+            
+        # arrays / lists: make sure they behave as if they were indexing the cropped region
+        else:
+            index = np.asarray( index )
+            if index.dtype == bool:
+                if len( index ) != n:
+                    raise IndexError( "boolean index did not match indexed array along dimension with size {}".format( n ) )
+                return np.nonzero( index )[0] + lower
+            if np.any( index < -n ) or np.any( index >= n ):
+                raise IndexError( "index is out of bounds for axis with size {}".format( n ) )
+            return lower + index % n
+    
+    # function to convert file steps into a slice if they are equally spaced (such that the data is not copied)
+    @staticmethod
+    def _as_slice( file_steps ):
+        if len( file_steps ) == 1:
+            return slice( file_steps[0], file_steps[0] + 1 )
+        
+        step = file_steps[1] - file_steps[0]
+        if step != 0 and np.all( np.diff( file_steps ) == step ):
+            stop = file_steps[-1] + step
+            return slice( file_steps[0], stop if stop >= 0 else None, step )
+        else:
+            return file_steps
+    
+    # function to read data of a single file (through the frame cache if it is enabled)
+    # as_slice: whether file steps and image indices are indexed independently (True) or 
+    # broadcast against each other as in numpy's advanced indexing (False)
+    def _read_file_data( self, file_no, file_steps, index1, index2, as_slice=True ):
+        if ir.frame_cache.enabled:
+            frames = self._read_cached_file_steps( file_no, file_steps )
+            return frames[ slice( None ) if as_slice else np.arange( len( file_steps ) ), index1, index2 ]
+        else:
+            with ir.file_hub.checked_out( self._files[file_no] ) as file:
+                return file[ self._selected_ext ].data[ self._as_slice( file_steps ) if as_slice else file_steps, index1, index2 ]
+    
+    # function to read uncropped frames of a single file through the frame cache
+    # note: frames are read through the section interface, such that the data of a file is never loaded completely
+    def _read_cached_file_steps( self, file_no, file_steps ):
+        path = self._files[file_no]
+        frames = [ ir.frame_cache.get( (path, self._selected_ext, int( file_step )) ) for file_step in file_steps ]
+        missing = [ i for i, frame in enumerate( frames ) if frame is None ]
+        
+        if len( missing ) > 0:
+            missing_steps = np.asarray( file_steps )[ missing ]
+            with ir.file_hub.checked_out( path ) as file:
+                missing_frames = self._read_file_steps( file[self._selected_ext], missing_steps, slice( None ), slice( None ), use_section=True )
+            
+            # copy the frames such that every cached frame owns exactly its memory
+            for i, file_step, frame in zip( missing, missing_steps, missing_frames ):
+                frames[i] = frame.copy()
+                ir.frame_cache.put( (path, self._selected_ext, int( file_step )), frames[i] )
+        
+        return np.stack( frames )
 
     # function to get an image step
     # Note: this method makes use of astropy's section method to directly access
@@ -550,7 +792,7 @@ class iris_data_cube:
         Returns
         -------
         numpy.ndarray
-            2D image at time step <step>. Format: [y,x] (SJI), [y,wavelength] (raster).
+            2D image at time step <step> (native float32). Format: [y,x] (SJI), [y,wavelength] (raster).
         """
         
         # Check whether line and step exist
@@ -562,27 +804,45 @@ class iris_data_cube:
             raise Exception("This raster position is not available.")
 
         # get file number and file step            
-        file_no, file_step, raster_pos = self._whereat( step, raster_pos=raster_pos )
+        file_no, file_step, image_raster_pos = self._whereat( step, raster_pos=raster_pos )
+        
+        # use the frame if it has been read ahead (frames are stored uncropped)
+        if ir.config.prefetch_steps > 0:
+            frame = self._get_prefetcher().get( step, raster_pos, file_no, file_step )
+            if frame is not None:
+                if self._cropped:
+                    return frame[self._ymin:self._ymax, self._xmin:self._xmax].astype( np.float32 )
+                else:
+                    return frame.astype( np.float32 )
 
         # put this into a try-except clause to catch too many open files
         # note: astropy opens multiple handles per file, file_hub can't control this
         try:
         
-            # request file from file hub
-            file = ir.file_hub.open( self._files[file_no] )
-                    
-            # get image (cropped if desired)
-            if self._cropped:
-                if ir.config.use_memmap: # use section interface if memory mapping is used
-                    return file[self._selected_ext].section[file_step, self._ymin:self._ymax, self._xmin:self._xmax]
-                else: # otherwise use data interface
-                    return file[self._selected_ext].data[file_step, self._ymin:self._ymax, self._xmin:self._xmax]
-            else:
+            # read image through the frame cache if it is enabled
+            if ir.frame_cache.enabled:
+                frame = self._read_cached_file_steps( file_no, [file_step] )[0]
+                if self._cropped:
+                    return np.asarray( frame[self._ymin:self._ymax, self._xmin:self._xmax], dtype=np.float32 )
+                else:
+                    return np.asarray( frame, dtype=np.float32 )
             
-                if ir.config.use_memmap: # use section interface if memory mapping is used
-                    return file[self._selected_ext].section[file_step, :, :]
-                else: # otherwise use data interface
-                    return file[self._selected_ext].data[file_step, :, :]
+            # request file from file hub (checked out such that no other thread can close it while reading)
+            # and convert the image to native float32 (FITS data is big-endian)
+            with ir.file_hub.checked_out( self._files[file_no] ) as file:
+                    
+                # get image (cropped if desired)
+                if self._cropped:
+                    if ir.config.use_memmap: # use section interface if memory mapping is used
+                        return np.asarray( file[self._selected_ext].section[file_step, self._ymin:self._ymax, self._xmin:self._xmax], dtype=np.float32 )
+                    else: # otherwise use data interface
+                        return np.asarray( file[self._selected_ext].data[file_step, self._ymin:self._ymax, self._xmin:self._xmax], dtype=np.float32 )
+                else:
+                
+                    if ir.config.use_memmap: # use section interface if memory mapping is used
+                        return np.asarray( file[self._selected_ext].section[file_step, :, :], dtype=np.float32 )
+                    else: # otherwise use data interface
+                        return np.asarray( file[self._selected_ext].data[file_step, :, :], dtype=np.float32 )
         
         except OSError as oe:
             if oe.strerror.lower() == "too many open files":
@@ -603,6 +863,219 @@ The current output has been re-requested and is not affected.
                 raise oe
                 
             
+    # function to get a lazy array facade
+    def as_lazy_array( self, chunk_steps=100, n_workers=4 ):
+        """
+        Returns a lazy, numpy-like array facade of the data cube with shape and
+        dtype. Indexing (including ellipsis and fewer than three indices) reads 
+        only the required files. Reductions (sum, mean, min, max) and map_blocks
+        are computed blockwise on chunks of image steps that are read on a
+        thread pool, such that whole-cube statistics run out-of-core.
+        
+        Parameters
+        ----------
+        chunk_steps : int
+            Number of image steps per chunk.
+        n_workers : int
+            Number of threads that read and process chunks.
+            
+        Returns
+        -------
+        lazy_array :
+            Lazy array facade of the data cube.
+        """
+        return lazy_array( self, chunk_steps=chunk_steps, n_workers=n_workers )
+    
+    # function to get the prefetcher (created on first use or if the number of steps to read ahead changed)
+    def _get_prefetcher( self ):
+        if self._prefetcher is None or self._prefetcher._n_steps != ir.config.prefetch_steps:
+            if self._prefetcher is not None:
+                self._prefetcher.close()
+            self._prefetcher = prefetcher( self, ir.config.prefetch_steps )
+        return self._prefetcher
+            
+    # function to get multiple image steps at once
+    def get_image_steps( self, steps, raster_pos=None, divide_by_exptime=False, out=None ):
+        """
+        Returns the images at the given steps as a three-dimensional array. 
+        Steps are grouped by file and every file is read only once, which is
+        much faster than calling get_image_step for every single step.
+        
+        Parameters
+        ----------
+        steps : list / numpy.ndarray / range
+            Time steps in the data cube (in any order).
+        raster_pos : int
+            Raster position. If raster_pos is not None, steps are interpreted
+            as steps on the given raster position.
+        divide_by_exptime : bool
+            Whether to divide images by their exposure time or not. Dividing by exposure
+            time will present normalized images instead of the usual data numbers.
+        out : numpy.ndarray
+            Optional buffer with shape (len(steps), n_y, n_x) to write the images to.
+            
+        Returns
+        -------
+        numpy.ndarray
+            Images with format [step,y,x] (SJI), [step,y,wavelength] (raster),
+            native float32 (as data_cube[index]) unless `out` is given.
+        """
+        
+        steps = np.asarray( steps, dtype=int ).reshape(-1)
+        
+        # get global steps
+        if raster_pos is None:
+            global_steps = steps
+            n_available = self.n_steps
+        else:
+            if raster_pos >= self.n_raster_pos:
+                raise Exception("This raster position is not available.")
+            raster_pos_steps = self._get_raster_pos_index( raster_pos )
+            n_available = len( raster_pos_steps )
+            global_steps = raster_pos_steps[ steps[ (steps >= 0) & (steps < n_available) ] ]
+            
+        # check whether steps exist
+        if np.any( steps < 0 ) or np.any( steps >= n_available ):
+            raise ValueError( "This image step does not exist!" )
+        
+        # check output buffer
+        if out is not None and ( out.ndim != 3 or out.shape[0] != len( steps ) or out.shape[1:] != self.shape[1:] ):
+            raise ValueError( "The output buffer should have shape {}".format( tuple( [len( steps )] + list( self.shape[1:] ) ) ) )
+            
+        # read images file by file (one read per file) and put them to their positions in the (native float32) output
+        if out is None:
+            out = np.empty( tuple( [len( steps )] + list( self.shape[1:] ) ), dtype=np.float32 )
+        for positions, images in self._iter_file_images( global_steps ):
+            out[positions] = images
+            
+        # divide images by exposure time
+        if divide_by_exptime:
+            exptime_key = self._get_exptime_key()
+            exptimes = self._get_time_specific_columns( global_steps, keys=[exptime_key] ).get( exptime_key, np.array([]) ).astype( float )
+            np.divide( out, exptimes.reshape(-1,1,1), out=out, where=out>0 )
+            
+        return out
+    
+    # function to read the (cropped) images of the given global steps file by file:
+    # yields the positions in global_steps and the images of every involved file
+    def _iter_file_images( self, global_steps ):
+        
+        # get image bounds
+        if self._cropped:
+            y_slice, x_slice = slice( self._ymin, self._ymax ), slice( self._xmin, self._xmax )
+        else:
+            y_slice, x_slice = slice( None ), slice( None )
+        
+        file_steps = self._valid_steps[ global_steps, :2 ]
+        order = np.argsort( file_steps[:,0], kind='stable' )
+        file_numbers, first_positions = np.unique( file_steps[order,0], return_index=True )
+        for file_no, positions in zip( file_numbers, np.split( order, first_positions[1:] ) ):
+            if ir.frame_cache.enabled:
+                images = self._read_cached_file_steps( file_no, file_steps[positions,1] )[:, y_slice, x_slice]
+            else:
+                with ir.file_hub.checked_out( self._files[file_no] ) as file:
+                    images = self._read_file_steps( file[self._selected_ext], file_steps[positions,1], y_slice, x_slice )
+            
+            yield positions, images
+    
+    # function to read a number of steps from a single file
+    def _read_file_steps( self, hdu, file_steps, y_slice, x_slice, use_section=None ):
+        
+        # data interface: a single fancy-indexed read
+        if not ( ir.config.use_memmap if use_section is None else use_section ):
+            return hdu.data[ file_steps, y_slice, x_slice ]
+        
+        # section interface (memory mapping): read the range spanned by the steps if they are dense, otherwise read them one by one
+        first, last = np.min( file_steps ), np.max( file_steps ) + 1
+        if 2 * len( file_steps ) >= last - first:
+            return hdu.section[first:last, y_slice, x_slice][ file_steps - first ]
+        else:
+            return np.stack( [ hdu.section[file_step, y_slice, x_slice] for file_step in file_steps ] )
+
+    # function to iterate over the data cube in chunks of image steps
+    def iter_chunks( self, chunk_steps=100, raster_pos=None, divide_by_exptime=False, with_headers=True ):
+        """
+        Iterates over the data cube in blocks of consecutive image steps (in
+        file order). While a chunk is processed, the next chunk is already read
+        in the background. Two buffers are reused alternately for all chunks:
+        a yielded array is only valid until the next chunk is requested (the
+        chunk after the next one is then read into it), copy it if it should
+        be kept.
+
+        Parameters
+        ----------
+        chunk_steps : int
+            Number of image steps per chunk.
+        raster_pos : int
+            Raster position. If raster_pos is not None, only the image steps on
+            the given raster position are iterated over.
+        divide_by_exptime : bool
+            Whether to divide images by their exposure time or not.
+        with_headers : bool
+            Whether to yield the headers of every chunk (None is yielded instead otherwise).
+
+        Yields
+        ------
+        tuple :
+            (step_indices, data, headers) with the image steps of the chunk
+            (steps on the given raster position if raster_pos is not None), the
+            images (native float32) with format [step,y,x] (SJI), [step,y,wavelength] (raster)
+            and a list with the header dictionaries of the chunk.
+        """
+
+        if chunk_steps < 1:
+            raise ValueError( "chunk_steps should be at least 1" )
+
+        # get steps to iterate over
+        if raster_pos is None:
+            n_available = self.n_steps
+            global_steps = np.arange( n_available )
+        else:
+            n_available = self.get_raster_pos_steps( raster_pos )
+            global_steps = self._get_raster_pos_index( raster_pos )
+
+        chunks = [ np.arange( start, min( start + chunk_steps, n_available ) ) for start in range( 0, n_available, chunk_steps ) ]
+        buffers = [None, None]
+
+        # prepare the lazy loaded header lists here and not concurrently in the background thread
+        if with_headers:
+            headers, time_specific_headers = self.headers, self.time_specific_headers
+
+        # read a chunk into one of the two buffers
+        def read_chunk( chunk_no ):
+            buffer = buffers[ chunk_no % 2 ]
+            out = None if buffer is None else buffer[:len( chunks[chunk_no] )]
+            data = self.get_image_steps( chunks[chunk_no], raster_pos=raster_pos, divide_by_exptime=divide_by_exptime, out=out )
+            if buffer is None:
+                buffers[ chunk_no % 2 ] = data
+            return data
+
+        # read ahead on a single background thread
+        with ThreadPoolExecutor( max_workers=1 ) as executor:
+            future = executor.submit( read_chunk, 0 ) if len( chunks ) > 0 else None
+            try:
+                for chunk_no, steps in enumerate( chunks ):
+                    data = future.result()
+                    if chunk_no + 1 < len( chunks ):
+                        future = executor.submit( read_chunk, chunk_no + 1 )
+                    yield steps, data, [ headers[ int( step ) ] for step in global_steps[ steps ] ] if with_headers else None
+            finally:
+                # do not leave a read running into a buffer when the iteration is stopped early
+                if future is not None:
+                    future.cancel()
+
+    # function to get the key of the exposure time in the time-specific headers
+    def _get_exptime_key( self ):
+        raise NotImplementedError( "This feature is not implemented in iris_data_cube, please use sji_cube or raster_cube" )
+    
+    # function to get the combined header keys that are copies of time-specific header keys (combined key -> time-specific key)
+    def _get_header_aliases( self ):
+        raise NotImplementedError( "This feature is not implemented in iris_data_cube, please use sji_cube or raster_cube" )
+    
+    # function to get the header dictionaries that are the same for every time step (in the order of precedence)
+    def _get_constant_headers( self ):
+        raise NotImplementedError( "This feature is not implemented in iris_data_cube, please use sji_cube or raster_cube" )
+            
     # cut data cube
     def cut( self, i_start, i_stop ):
         """
@@ -618,7 +1091,7 @@ The current output has been re-requested and is not affected.
         # create two series of indices, combine them and remove them from the data cube
         beginning = np.arange( i_start, dtype=int )
         end = np.arange( i_stop, self.n_steps, dtype=int )
-        self._remove_steps( np.concatenate([beginning,end]).tolist() )
+        self._remove_steps( np.concatenate([beginning,end]) )
         
 
     # crop data cube
@@ -809,28 +1282,94 @@ The current output has been re-requested and is not affected.
     
         return np.sum( self.get_image_step( step, divide_by_exptime=False ) >= 1.6e4 )
     
+    # function to compute per-frame and per-pixel statistics in one pass
+    def get_statistics( self, frame_statistics=FRAME_STATISTICS, pixel_statistics=PIXEL_STATISTICS, percentiles=(1, 50, 99), relative_accuracy=0.01, chunk_steps=None, use_cache=True ):
+        """
+        Computes per-frame and per-pixel statistics of the (cropped) data cube
+        while reading every image step only once. Percentiles are approximated
+        with mergeable quantile sketches of the given relative accuracy. NULL 
+        pixels (-200) are excluded from means, minima, maxima and percentiles,
+        saturated pixels have a data number >= 1.6e4 (as in get_nsatpix).
+        
+        The result is cached next to the valid steps cache (see 
+        ir.config.valid_steps_cache) and reused as long as the files, the 
+        valid steps, the bounds and the arguments do not change.
+        
+        Parameters
+        ----------
+        frame_statistics : tuple
+            Per-frame statistics: any of 'mean', 'min', 'max', 'nsatpix', 'null_fraction' and 'percentiles'.
+        pixel_statistics : tuple
+            Per-pixel statistics over time: any of 'mean', 'min', 'max', 'nsat' and 'null_fraction'.
+        percentiles : tuple
+            Percentiles (between 0 and 100) per frame and for the whole data cube.
+        relative_accuracy : float
+            Relative accuracy of the percentiles.
+        chunk_steps : int
+            Number of image steps that are read and processed at once (defaults
+            to as many as fit into 128 MB).
+        use_cache : bool
+            Whether to load and store the statistics from / to the cache.
+            
+        Returns
+        -------
+        cube_statistics :
+            Object with the per-frame statistics (frame, pandas.DataFrame), the 
+            per-pixel statistics (pixel, dict with arrays) and the percentiles of the whole data cube (percentiles, dict).
+        """
+        
+        # everything the result depends on apart from the files and the valid steps
+        options = { 'frame_statistics': list( frame_statistics ), 'pixel_statistics': list( pixel_statistics ), 'percentiles': list( percentiles ),
+                    'relative_accuracy': relative_accuracy, 'bounds': [ None if bound is None else int( bound ) for bound in self._get_bounds() ] }
+        variant = self._get_cache_variant()
+        
+        if use_cache:
+            statistics = load_statistics( self._files, variant, self._valid_steps, options )
+            if statistics is not None:
+                return statistics
+        
+        statistics = compute_statistics( self, frame_statistics, pixel_statistics, percentiles, relative_accuracy, chunk_steps )
+        
+        if use_cache:
+            store_statistics( self._files, variant, self._valid_steps, options, statistics )
+        
+        return statistics
+    
     # function to get millisecond timestamps of images
-    def get_timestamps( self, raster_pos=None ):
+    def get_timestamps( self, raster_pos=None, as_datetime=False ):
         """
-        Converts DATE_OBS to milliseconds since 1970 with the aim to make 
-        timestamp comparisons easier.
+        Returns the time stamps of the images (DATE_OBS with millisecond 
+        precision) in seconds since 1970 with the aim to make timestamp 
+        comparisons easier. The time stamps are computed directly from STARTOBS 
+        and the TIME column of the time-specific headers.
         
         Parameters
         ----------
         raster_pos : int
             raster position (between 0 and n_raster_pos)
+        as_datetime : bool
+            Whether to return the time stamps as numpy.datetime64[ms] instead.
         
         Returns
         -------
-        float :
-            List of millisecond timestamps.
+        numpy.ndarray :
+            Array with time stamps in seconds since 1970 (float64) or as datetime64[ms].
         """
         if raster_pos is None:
-            headers = self.time_specific_headers
+            steps = np.arange( self.n_steps )
         else:
-            headers = self.get_raster_pos_headers( raster_pos )
-            
-        return [to_epoch( from_Tformat( h['DATE_OBS'] ) ) for h in headers]
+            if raster_pos >= self.n_raster_pos:
+                raise Exception("This raster position is not available.")
+            steps = self._get_raster_pos_index( raster_pos )
+        
+        # same millisecond precision as DATE_OBS
+        times = self._get_time_specific_columns( steps, keys=['TIME'] ).get( 'TIME', np.array([]) )
+        dates = add_seconds( self.primary_headers['STARTOBS'], times ).astype( 'datetime64[ms]' )
+        
+        if as_datetime:
+            return dates
+        else:
+            return to_epoch_array( dates )
     
     # function to return exposure times
     def get_exptimes( self ):
@@ -842,7 +1381,51 @@ The current output has been re-requested and is not affected.
         list :
             List of exposure times.
         """
-        return np.array([h['EXPTIME'] for h in self.headers])
+        return self.get_header_column( 'EXPTIME' )
+    
+    # function to get the values of a header key for all time steps
+    def get_header_column( self, key, raster_pos=None ):
+        """
+        Returns the values of a header key for all time steps, as they would be
+        found in the combined headers (data_cube.headers). The values are read
+        directly from the columns of the time-specific header extension (only 
+        the files that are needed are read) and no header dictionaries are
+        created. Values of primary and line-specific headers are repeated for
+        every time step.
+        
+        Parameters
+        ----------
+        key : str
+            Header key (e.g. 'EXPTIME', 'XCENIX' or 'SAT_ROT')
+        raster_pos : int
+            raster position (between 0 and n_raster_pos), all time steps if None
+            
+        Returns
+        -------
+        numpy.ndarray :
+            Array with the values of the header key for every time step
+        """
+        
+        if raster_pos is None:
+            steps = np.arange( self.n_steps )
+        else:
+            if raster_pos >= self.n_raster_pos:
+                raise Exception("This raster position is not available.")
+            steps = self._get_raster_pos_index( raster_pos )
+        
+        # some combined header keys are copies of time-specific header keys
+        column_key = self._get_header_aliases().get( key, key )
+        
+        # time-specific header keys: read columns
+        if column_key in self._load_time_specific_header_columns( self._valid_steps[0,0] ):
+            return self._get_time_specific_columns( steps, keys=[column_key] )[ column_key ]
+        
+        # primary or line-specific header keys: repeat the value
+        for headers in self._get_constant_headers():
+            if key in headers:
+                return np.full( len( steps ), headers[key] )
+        
+        raise KeyError( "Header key {} not found".format( key ) )
 
     # function to get goes flux information
     def get_goes_flux( self ):
@@ -880,7 +1463,7 @@ The current output has been re-requested and is not affected.
         if raster_pos >= self.n_raster_pos:
             raise Exception("This raster position is not available.")
         
-        return self[self._valid_steps[:,2] == raster_pos,:,:]
+        return self[self._get_raster_pos_index( raster_pos ),:,:]
 
 
     # function to get headers of a fixed raster position
@@ -902,7 +1485,14 @@ The current output has been re-requested and is not affected.
         if raster_pos >= self.n_raster_pos:
             raise Exception("This raster position is not available.")
         
-        return [self.headers[i] for i in range(self.n_steps) if self._valid_steps[i,2] == raster_pos]
+        steps = self._get_raster_pos_index( raster_pos )
+        headers = self.headers[ steps ]
+        
+        # make sure that a single header is returned in a list as well
+        if len( steps ) == 1:
+            return [ headers ]
+        else:
+            return headers
     
     # function to return number of exposures for a given raster position
     def get_raster_pos_steps( self, raster_pos ):
@@ -923,7 +1513,7 @@ The current output has been re-requested and is not affected.
         if raster_pos >= self.n_raster_pos:
             raise Exception("This raster position is not available.")
         
-        return np.sum( self._valid_steps[:,2] == raster_pos )
+        return len( self._get_raster_pos_index( raster_pos ) )
     
     # function to get the overall step for a pair (raster_pos, raster_step)
     def get_global_raster_step( self, raster_pos, raster_step ):
@@ -952,16 +1542,13 @@ The current output has been re-requested and is not affected.
             global raster image step
         """
         
-        v = self._valid_steps
-        
         # allow raster_step for raster position 0 to go over the maximum to make sure that ranges can be represented correctly
         if raster_pos == 0 and raster_step == self.get_raster_pos_steps( raster_pos ):
             global_step = self.n_steps
         
         else:
-            # filter out only valid step entries for the given raster position and access raster step
-            identifier = v[v[:,2]==raster_pos][ raster_step ]
-            global_step = np.where( np.all( v==identifier, axis=1 ) )[0][0]
+            # look up raster step in the global steps of the given raster position
+            global_step = self._get_raster_pos_index( raster_pos )[ raster_step ]
         
         return global_step
     
@@ -11,6 +11,7 @@ from IPython.core.display import HTML
 import irisreader as ir
 from irisreader import sji_cube, raster_cube, get_lines
 from irisreader.has_line import find_line
+from irisreader.utils.fits import read_headers
 from irisreader.coalignment import goes_data, hek_data
 
 
@@ -154,14 +155,8 @@ class raster_loader:
         self._raster_files = raster_files
         self._keep_null = keep_null
         
-        # open first raster
-        self._first_raster = raster_cube( raster_files[0], keep_null=keep_null )
-        
-        # set line info
-        self._line_info = get_lines( self._first_raster )
-        
-        # close first raster as it is not needed anymore
-        self._first_raster.close()
+        # set line info (only reads the primary header and the first data extension header of the first raster)
+        self._line_info = get_lines( raster_files[0] )
         
         # raster data will be lazy loaded for each line
         self._raster_data = [[]] * len( self._line_info )
@@ -325,12 +320,13 @@ class observation:
         if self.raster is None:
             warnings.warn("No raster files in this observation.")
 
-        # set a few interesting KPIs
-        self.obsid = self.sji[0].obsid
-        self.mode = self.sji[0].mode
-        self.desc = self.sji[0].desc
-        self.start_date = self.sji[0].start_date
-        self.end_date = self.sji[0].end_date
+        # set a few interesting KPIs (only reads the primary header of the first file)
+        primary_headers = read_headers( ( self._sji_files + self._raster_files )[0], n_headers=1 )[0]
+        self.obsid = primary_headers['OBSID']
+        self.desc = primary_headers['OBS_DESC']
+        self.mode = 'sit-and-stare' if 'sit-and-stare' in self.desc else 'n-step raster'
+        self.start_date = primary_headers['STARTOBS']
+        self.end_date = primary_headers['ENDOBS']
         self.full_obsid = self.path.strip('/').split("/")[-1]
         if not re.match(r"[0-9]{8}_[0-9]{6}_[0-9]{10}", self.full_obsid ):
             self.full_obsid = None
@@ -11,7 +11,8 @@ class image_cropper( BaseEstimator, TransformerMixin ):
     -200.
     
     The bounds are found by moving in lines from all sides towards the center
-    until the number of nonzero pixels stops increasing. To make sure everything
+    until the number of nonzero pixels stops increasing (the nonzero pixels of
+    all columns and rows are counted at once). To make sure everything
     worked well, the cropped image is checked for negative pixels at the end,
     throwing an error if more than 5% of the image border pixels or the whole image
     are negative. In this way, bounds for the image are determined with the `fit`
@@ -63,56 +64,21 @@ class image_cropper( BaseEstimator, TransformerMixin ):
         
         # set image reference for access outside the fit function
         self._image_ref = X
+        
+        # mask of nonzero pixels (NaN pixels are neither nonzero nor negative)
+        nonzero = self._image_ref >= 0
 
         # raise exception if the image is NULL (-200) everywhere
-        if np.all( self._image_ref < 0 ):
+        if not np.any( nonzero ) and np.all( self._image_ref < 0 ):
             raise NullImageException("Null image cannot be cropped")
         
-        # functions to get bounds on the image from all sides:
-        # A line is moved from the outside towards the center until the number 
-        # of nonzero pixels stops increasing 
-        def get_lower_bound( image ):
-            previous_nonzero_pixels = 0
-            for i in range( image.shape[1] ):
-                nonzero_pixels = np.sum( image[:,i] >= 0 )
-                if nonzero_pixels > 0 and previous_nonzero_pixels-nonzero_pixels>=0 and i>0:
-                    return i
-                previous_nonzero_pixels = nonzero_pixels
-            return image.shape[1]
-
-        def get_upper_bound( image ):
-            previous_nonzero_pixels = 0
-            for i in range( image.shape[1] ):
-                nonzero_pixels = np.sum( image[:,image.shape[1]-i-1] >= 0 )
-                if nonzero_pixels > 0 and previous_nonzero_pixels-nonzero_pixels>=0 and i>0:
-                    return image.shape[1]-i
-                previous_nonzero_pixels = nonzero_pixels
-            return image.shape[1]
-
-        def get_left_bound( image ):
-            previous_nonzero_pixels = 0
-            for i in range( image.shape[0] ):
-                nonzero_pixels = np.sum( image[i,:] >= 0 )
-                if nonzero_pixels > 0 and previous_nonzero_pixels-nonzero_pixels>=0 and i>0:
-                    return i
-                previous_nonzero_pixels = nonzero_pixels
-            return image.shape[0]
-        
-        def get_right_bound( image ):
-            previous_nonzero_pixels = 0
-            for i in range( image.shape[0] ):
-                nonzero_pixels = np.sum( image[image.shape[0]-i-1,:] >= 0 )
-                if nonzero_pixels > 0 and previous_nonzero_pixels-nonzero_pixels>=0 and i>0:
-                    return image.shape[0]-i
-        
-                previous_nonzero_pixels = nonzero_pixels
-            return image.shape[0]
-
-        # set image boundaries (plus add a possible defined offset)
-        self._xmin = get_lower_bound( self._image_ref ) + self._offset
-        self._xmax = get_upper_bound( self._image_ref ) - self._offset
-        self._ymin = get_left_bound( self._image_ref ) + self._offset
-        self._ymax = get_right_bound( self._image_ref ) - self._offset
+        # set image boundaries (plus add a possible defined offset):
+        # the lines are moved over the number of nonzero pixels per column and row
+        xmin, xmax, ymin, ymax = get_bounds_from_profiles( _count_along( nonzero, axis=0 ), _count_along( nonzero, axis=1 ) )
+        self._xmin = int( xmin ) + self._offset
+        self._xmax = int( xmax ) - self._offset
+        self._ymin = int( ymin ) + self._offset
+        self._ymax = int( ymax ) - self._offset
         
         # check whether image has some extent at all
         min_extent = 10 # TODO: this needs to be on better theoretical foundation
@@ -123,10 +89,10 @@ class image_cropper( BaseEstimator, TransformerMixin ):
         # image border are still negative
         # This check can be disable with check_coverage = False
         if self._check_coverage:
-            if np.mean( self._image_ref[self._ymin:self._ymax,self._xmin:self._xmax] < 0 ) > 0.05:
+            if _negative_fraction( self._image_ref[self._ymin:self._ymax,self._xmin:self._xmax] ) > 0.05:
                 raise CorruptImageException("Image might contain a corrupt patch, more than 5% have a negative pixel value!")
         
-            if np.mean( self._image_ref[self._ymin,self._xmin:self._xmax] < 0 ) > 0.05 or np.mean( self._image_ref[self._ymax,self._xmin:self._xmax] < 0 ) > 0.05 or np.mean( self._image_ref[self._ymin:self._ymax,self._xmin] < 0 ) > 0.05 or np.mean( self._image_ref[self._ymin:self._ymax,self._xmax] < 0 ) > 0.05:
+            if _negative_fraction( self._image_ref[self._ymin,self._xmin:self._xmax] ) > 0.05 or _negative_fraction( self._image_ref[self._ymax,self._xmin:self._xmax] ) > 0.05 or _negative_fraction( self._image_ref[self._ymin:self._ymax,self._xmin] ) > 0.05 or _negative_fraction( self._image_ref[self._ymin:self._ymax,self._xmax] ) > 0.05:
                 raise CorruptImageException("Image border contains more than 5% negative pixels!")
         
         return self
@@ -177,6 +143,138 @@ class image_cropper( BaseEstimator, TransformerMixin ):
             plt.plot( [self._xmax,self._xmax], [self._ymin,self._ymax], color='white' ); plt.plot( [self._xmin, self._xmin], [self._ymin,self._ymax], color='white' )
             plt.show()
 
+# function to find the first position in which the sliding line stops
+def _get_stop_positions( profiles ):
+    """
+    Moves a line over the given profiles of nonzero pixel counts (along the
+    last axis) and returns the first position i > 0 at which the number of
+    nonzero pixels is positive and does not increase anymore (the length of
+    the profile if there is no such position).
+    """
+    stops = ( profiles[...,1:] > 0 ) & ( profiles[...,:-1] >= profiles[...,1:] )
+    if stops.shape[-1] == 0:
+        return np.full( profiles.shape[:-1], profiles.shape[-1] )
+    return np.where( np.any( stops, axis=-1 ), np.argmax( stops, axis=-1 ) + 1, profiles.shape[-1] )
+
+# function to count the pixels of a mask along an axis
+def _count_along( mask, axis ):
+    """
+    Returns the number of True pixels of a boolean mask along the given axis
+    (as np.count_nonzero, but without converting the mask to intp first).
+    """
+    return np.add.reduce( mask.view( np.uint8 ), axis=axis, dtype=np.int32 )
+
+# function to get the fraction of negative pixels
+def _negative_fraction( image ):
+    """
+    Returns the fraction of negative pixels of an image (NaN for empty images,
+    as np.mean( image < 0 )).
+    """
+    if image.size == 0:
+        return np.nan
+    return np.count_nonzero( image < 0 ) / image.size
+
+# function to get the image bounds from the nonzero pixel counts per column and per row
+def get_bounds_from_profiles( column_counts, row_counts ):
+    """
+    Returns the bounds that the sliding lines approach of image_cropper finds
+    from the number of nonzero pixels per column and per row. A line is moved 
+    from the outside towards the center until the number of nonzero pixels 
+    stops increasing. Leading axes are treated as independent images, such
+    that the bounds of a whole stack of images are found at once.
+    
+    Parameters
+    ----------
+    column_counts : numpy.ndarray
+        Number of nonzero pixels per column, format [..., x]
+    row_counts : numpy.ndarray
+        Number of nonzero pixels per row, format [..., y]
+    
+    Returns
+    -------
+    tuple :
+        Bounds (xmin, xmax, ymin, ymax) without offset (integers or arrays for stacks of images)
+    """
+    nx, ny = column_counts.shape[-1], row_counts.shape[-1]
+    
+    # lower and left bounds: move in from the start, upper and right bounds: move in from the end
+    upper_stops = _get_stop_positions( column_counts[...,::-1] )
+    right_stops = _get_stop_positions( row_counts[...,::-1] )
+    xmin = _get_stop_positions( column_counts )
+    xmax = np.where( upper_stops < nx, nx - upper_stops, nx )
+    ymin = _get_stop_positions( row_counts )
+    ymax = np.where( right_stops < ny, ny - right_stops, ny )
+    
+    return xmin, xmax, ymin, ymax
+
+# function to fit the bounds of a whole stack of images at once
+def fit_image_stack( images, offset=0, check_coverage=True ):
+    """
+    Applies image_cropper.fit to every image of a stack with vectorized
+    reductions over the whole stack: the nonzero pixels are counted per column
+    and row of every image at once, and only the cropped regions and their
+    borders are compared for the coverage check. The results are identical to fitting every image with image_cropper (images
+    whose border lies outside of the image are fitted with image_cropper).
+    
+    Parameters
+    ----------
+    images : numpy.ndarray
+        Stack of images, format [step,y,x]
+    offset : integer
+        Number of pixels that are removed as a safety border from all sides.
+    check_coverage : boolean
+        Whether to check the coverage of the cropped images (see image_cropper).
+    
+    Returns
+    -------
+    tuple :
+        Bounds (array with rows [xmin, xmax, ymin, ymax], [0,0,0,0] for null and corrupt images),
+        boolean array that flags null images and boolean array that flags corrupt images.
+    """
+    
+    n_images, ny, nx = images.shape
+    
+    # bounds of all images from the nonzero pixel counts per column and row
+    # (as in image_cropper, NaN pixels are neither nonzero nor negative)
+    nonzero = images >= 0
+    column_counts, row_counts = _count_along( nonzero, axis=1 ), _count_along( nonzero, axis=2 )
+    xmin, xmax, ymin, ymax = get_bounds_from_profiles( column_counts, row_counts )
+    
+    # null images: images that are negative everywhere (only images without nonzero pixels can be null)
+    is_null = np.zeros( n_images, dtype=bool )
+    candidates = np.where( np.sum( row_counts, axis=1 ) == 0 )[0]
+    is_null[candidates] = np.all( images[candidates] < 0, axis=(1,2) )
+    xmin, xmax, ymin, ymax = xmin + offset, xmax - offset, ymin + offset, ymax - offset
+    
+    # images that contain almost no data after cropping
+    is_corrupt = ~is_null & ( ( xmax - xmin < 10 ) | ( ymax - ymin < 10 ) )
+    
+    # coverage of the cropped images and their borders (fraction of negative pixels)
+    if check_coverage:
+        checked = np.where( ~is_null & ~is_corrupt )[0]
+        
+        # borders outside of the image: leave it to image_cropper
+        outside = ( xmin[checked] < 0 ) | ( ymin[checked] < 0 ) | ( xmax[checked] >= nx ) | ( ymax[checked] >= ny )
+        fallback, checked = checked[outside], checked[~outside]
+        
+        # only the cropped region and its borders are compared
+        for step in checked:
+            image, x0, x1, y0, y1 = images[step], xmin[step], xmax[step], ymin[step], ymax[step]
+            is_corrupt[step] = _negative_fraction( image[y0:y1,x0:x1] ) > 0.05 or \
+                               _negative_fraction( image[y0,x0:x1] ) > 0.05 or _negative_fraction( image[y1,x0:x1] ) > 0.05 or \
+                               _negative_fraction( image[y0:y1,x0] ) > 0.05 or _negative_fraction( image[y0:y1,x1] ) > 0.05
+        
+        cropper = image_cropper( offset=offset, check_coverage=check_coverage )
+        for step in fallback:
+            try:
+                cropper.fit( images[step] )
+            except CorruptImageException:
+                is_corrupt[step] = True
+    
+    bounds = np.column_stack( [ xmin, xmax, ymin, ymax ] )
+    bounds[ is_null | is_corrupt ] = 0
+    return bounds, is_null, is_corrupt
+
 # Exception classes for null images and corrupt images
 class NullImageException(Exception):
     pass
@@ -5,6 +5,10 @@ from sklearn.base import BaseEstimator, TransformerMixin
 from tqdm import tqdm
 import irisreader as ir
 from irisreader.preprocessing import image_cropper, CorruptImageException, NullImageException
+from irisreader.preprocessing.image_cropper import fit_image_stack
+
+# approximate number of bytes of images that are fitted at once
+CROP_CHUNK_BYTES = 2**26
 
 class image_cube_cropper( BaseEstimator, TransformerMixin ):
     """Implements a transformer that can crop all images of an observed line 
@@ -98,43 +102,31 @@ class image_cube_cropper( BaseEstimator, TransformerMixin ):
         if self._data_cube_object.type == 'sji' and self._data_cube_object.mode != "sit-and-stare":
             raise ValueError("Only sit-and-stare observation can be cropped as a cube!")
         
-        # set up image cropper
-        cropper = image_cropper( offset=self._offset, check_coverage=self._check_coverage )
-        
-        # get bounds on all images in the cube and store null and corrupt images
-        image_bounds = []
+        # get bounds on all images in the cube and store null and corrupt images:
+        # images are read in chunks (the next chunk is read in the background) and every chunk is fitted at once
+        n_steps = self._data_cube_object.n_steps
+        width, height = self._data_cube_object.shape[1:]
+        chunk_steps = max( 1, CROP_CHUNK_BYTES // ( width * height * 8 ) )
+        image_bounds = np.zeros( ( n_steps, 4 ), dtype=int )
         
         # create progress bar for crop if verbosity_level is >= 1
-        step_range = range( self._data_cube_object.n_steps )
-        if ir.config.verbosity_level >= 1:
-            step_range = tqdm( step_range )
-        
-        for step in step_range:
-            try:
-                cropper.fit( self._data_cube_object.get_image_step( step ) )
-                image_bounds.append( cropper.get_bounds() )
-            
-            except CorruptImageException:
-                image_bounds.append( [0,0,0,0] )
-                self._corrupt_images.append( step )
-            
-            except NullImageException:
-                image_bounds.append( [0,0,0,0] )
-                self._null_images.append( step )
-                
-        
-#        pool = multiprocessing.Pool()
-#        res = pool.map( self._crop_image, range( self._data_cube_object.n_steps ) )
-#        
-#        return res
-        
-        image_bounds = np.vstack( image_bounds )
+        progress_bar = tqdm( total=n_steps ) if ir.config.verbosity_level >= 1 else None
+        
+        for steps, images, _ in self._data_cube_object.iter_chunks( chunk_steps, with_headers=False ):
+            bounds, is_null, is_corrupt = fit_image_stack( images, offset=self._offset, check_coverage=self._check_coverage )
+            image_bounds[steps] = bounds
+            self._null_images += steps[is_null].tolist()
+            self._corrupt_images += steps[is_corrupt].tolist()
+            if progress_bar is not None:
+                progress_bar.update( len( steps ) )
+        
+        if progress_bar is not None:
+            progress_bar.close()
         
         # define outliers as values that deviate more than 1.5% from the 
         # median bound (20 pixels on 1000 pixels)
         # TODO: how to put this onto a more rigourous footing?
         outlier_threshold = 0.02
-        width, height = self._data_cube_object.get_image_step( 0 ).shape
         outlier_score = np.max(np.abs(image_bounds - np.median(image_bounds, axis=0)) / (np.array([width, width, height, height])), axis=1)
         
         # add outliers to corrupt images and remove null images from corrupt images
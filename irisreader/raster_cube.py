@@ -77,26 +77,6 @@ class raster_cube( iris_data_cube ):
         else:
             return super().__getattribute__( name ) # call method of class where we inherited from
     
-    # function to convert time-specific headers from a file to combined headers
-    def _load_combined_header_file( self, file_no ):
-        if ir.config.verbosity_level >= 2: print("[raster_cube] Lazy loading combined headers for file {}".format(file_no))
-        
-        # get time-specific headers for file and add primary headers and line-specific headers
-        file_time_specific_headers = self._load_time_specific_header_file( file_no )
-        combined_headers = [ dict( list(self.primary_headers.items()) + list(self.line_specific_headers.items()) + list(t_header.items()) ) for t_header in file_time_specific_headers ]
-        
-        # change some headers 'manually'
-        for i in range( len(combined_headers) ):
-            combined_headers[i]['XCEN'] = combined_headers[i]['XCENIX'] # this is not modified in IDL!
-            combined_headers[i]['YCEN'] = combined_headers[i]['YCENIX'] # this is not modified in IDL!
-            combined_headers[i]['CRVAL2'] = combined_headers[i]['YCENIX'] # this is not modified in IDL!
-
-            # set EXPTIME = EXPTIMEF in FUV and EXPTIME = EXPTIMEN in NUV (this is not modified in IDL!)
-            waveband = combined_headers[i]['TDET'+str(self._selected_ext)][0]
-            combined_headers[i]['EXPTIME'] = combined_headers[i]['EXPTIME'+waveband]
-        
-        return combined_headers
-
     # overwrite get_image_step function to be able to divide by exposure time
     # divide_by_exptime defaults to False because the exposure time has to be 
     # searched for in the time-specific headers which slows file access down.
@@ -128,24 +108,83 @@ class raster_cube( iris_data_cube ):
             # get image
             image = super().get_image_step( step, raster_pos=raster_pos )             
             
-            # get uv region
-            uv_region = self.line_specific_headers['WAVEWIN'][0]
-            
-            # get exposure time stored in 'EXPTIMES'
+            # get exposure time stored in 'EXPTIMEF' / 'EXPTIMEN'
             if raster_pos is not None:
-                header_step = np.argwhere( self._valid_steps[:,2]==raster_pos )[step][0]
+                header_step = self._get_raster_pos_index( raster_pos )[step]
             else:
                 header_step = step
                 
-            exptime = self.time_specific_headers[ header_step ]['EXPTIME'+uv_region]
+            exptime = self.time_specific_headers[ header_step ][ self._get_exptime_key() ]
             
-            # divide image by exposure time
-            image[image>0] /= exptime
-            return image
+            # divide image by exposure time (into a new array: the image might be a view on cached data)
+            return np.divide( image, exptime, out=image.astype( np.float32 ), where=image>0 )
         
         else: 
             return super().get_image_step( step, raster_pos=raster_pos )
     
+    # function to get the key of the exposure time in the time-specific headers (depends on uv region)
+    def _get_exptime_key( self ):
+        return 'EXPTIME' + self.line_specific_headers['WAVEWIN'][0]
+    
+    # function to get the combined header keys that are copies of time-specific header keys
+    # (XCEN, YCEN, CRVAL2 and EXPTIME = EXPTIMEF in FUV / EXPTIMEN in NUV are not modified in IDL!)
+    def _get_header_aliases( self ):
+        return { 'XCEN': 'XCENIX', 'YCEN': 'YCENIX', 'CRVAL2': 'YCENIX', 'EXPTIME': self._get_exptime_key() }
+    
+    # function to get the header dictionaries that are the same for every time step (in the order of precedence)
+    def _get_constant_headers( self ):
+        return [ self.line_specific_headers, self.primary_headers ]
+    
+    # function to get the data of n-step rasters as sweeps over the raster positions
+    def get_sweep_data( self, fill_value=np.nan, divide_by_exptime=False ):
+        """
+        Returns the data as a four-dimensional array [sweep, raster_pos, y, wavelength].
+        The array is filled in a single pass over the files, every file is read
+        only once. Images that are missing in a sweep (e.g. null images) are set
+        to fill_value, sweeps without any valid image are left out. For 
+        sit-and-stare rasters, every time step is a sweep with a single raster
+        position. The output can directly be passed to profile_rep in
+        irisreader.utils.get_mg2k_features.
+        
+        Parameters
+        ----------
+        fill_value : float
+            Value of the images that are missing in a sweep.
+        divide_by_exptime : bool
+            Whether to divide images by their exposure time or not.
+            
+        Returns
+        -------
+        numpy.ndarray
+            Data with format [sweep, raster_pos, y, wavelength].
+        """
+        
+        sweeps = self._get_sweep_numbers()
+        raster_positions = self._valid_steps[:,2]
+        n_sweeps = sweeps[-1] + 1
+        n_raster_pos = max( self.n_raster_pos, np.max( raster_positions ) + 1 )
+        
+        if divide_by_exptime:
+            exptime_key = self._get_exptime_key()
+            exptimes = self._get_time_specific_columns( np.arange( self.n_steps ), keys=[exptime_key] )[ exptime_key ].astype( float )
+        
+        # read the images file by file and put them to their sweep and raster position
+        out = None
+        for positions, images in self._iter_file_images( np.arange( self.n_steps ) ):
+            if out is None:
+                out = np.full( tuple( [n_sweeps, n_raster_pos] + list( images.shape[1:] ) ), fill_value, dtype=np.result_type( images.dtype, fill_value ) )
+            if divide_by_exptime:
+                images = np.divide( images, exptimes[positions].reshape(-1,1,1), out=images.astype( out.dtype ), where=images>0 )
+            out[ sweeps[positions], raster_positions[positions] ] = images
+        
+        return out
+    
+    # function to get the sweep number of every time step
+    # (a new sweep starts with every file and after every n_raster_pos steps within a file)
+    def _get_sweep_numbers( self ):
+        file_sweeps = self._valid_steps[:,0] * ( np.max( self._valid_steps[:,1] ) + 1 ) + self._valid_steps[:,1] // self.n_raster_pos
+        return np.unique( file_sweeps, return_inverse=True )[1].reshape(-1)
+    
     # function to get interpolated image step
     def get_interpolated_image_step( self, step, lambda_min, lambda_max, n_breaks, raster_pos=None, divide_by_exptime=False ):
         """
@@ -71,28 +71,6 @@ class sji_cube( iris_data_cube ):
     def __repr__( self ):
         return "SJI {} line window:\n(n_steps, n_y, n_x) = {}".format( self.line_info, self.shape )
 
-    # function to convert time-specific headers from a file to combined headers
-    def _load_combined_header_file( self, file_no ):
-        if ir.config.verbosity_level >= 2: print("[si_cube] Lazy loading combined headers for file {}".format(file_no))
-        
-        # get time-specific headers for file and add primary headers and line-specific headers
-        file_time_specific_headers = self._load_time_specific_header_file( file_no )
-        combined_headers = [ dict( list(self.primary_headers.items()) + list(t_header.items()) ) for t_header in file_time_specific_headers ]
-        
-        # change some headers 'manually'
-        for i in range( len(combined_headers) ):
-            combined_headers[i]['XCEN'] = combined_headers[i]['XCENIX']
-            combined_headers[i]['YCEN'] = combined_headers[i]['YCENIX']
-            combined_headers[i]['PC1_1'] = combined_headers[i]['PC1_1IX']
-            combined_headers[i]['PC1_2'] = combined_headers[i]['PC1_2IX']
-            combined_headers[i]['PC2_1'] = combined_headers[i]['PC2_1IX']
-            combined_headers[i]['PC2_2'] = combined_headers[i]['PC2_2IX']
-            combined_headers[i]['CRVAL1'] = combined_headers[i]['XCENIX']
-            combined_headers[i]['CRVAL2'] = combined_headers[i]['YCENIX']
-            combined_headers[i]['EXPTIME'] = combined_headers[i]['EXPTIMES']
-        
-        return combined_headers
-
     # overwrite get_image_step function to be able to divide by exposure time
     # divide_by_exptime defaults to False because the exposure time has to be 
     # searched for in the time-specific headers which slows file access down.
@@ -127,20 +105,32 @@ class sji_cube( iris_data_cube ):
             # get exposure time stored in 'EXPTIMES' (make sure we get the right headers if raster_pos is not None)
             # repeating _whereat here to save time; maybe this can be implemented in a better way
             if raster_pos is not None:
-                header_step = np.argwhere( self._valid_steps[:,2]==raster_pos )[step][0]
+                header_step = self._get_raster_pos_index( raster_pos )[step]
             else:
                 header_step = step
 
-            exptime = self.time_specific_headers[ header_step ]['EXPTIMES']
+            exptime = self.time_specific_headers[ header_step ][ self._get_exptime_key() ]
         
-            # divide image by exposure time
-            image[image>0] /= exptime
-            return image
+            # divide image by exposure time (into a new array: the image might be a view on cached data)
+            return np.divide( image, exptime, out=image.astype( np.float32 ), where=image>0 )
         
         else:
             return super().get_image_step( step, raster_pos=raster_pos ) 
         
             
+    # function to get the key of the exposure time in the time-specific headers
+    def _get_exptime_key( self ):
+        return 'EXPTIMES'
+    
+    # function to get the combined header keys that are copies of time-specific header keys
+    def _get_header_aliases( self ):
+        return { 'XCEN': 'XCENIX', 'YCEN': 'YCENIX', 'PC1_1': 'PC1_1IX', 'PC1_2': 'PC1_2IX', 'PC2_1': 'PC2_1IX', 'PC2_2': 'PC2_2IX',
+                 'CRVAL1': 'XCENIX', 'CRVAL2': 'YCENIX', 'EXPTIME': self._get_exptime_key() }
+    
+    # function to get the header dictionaries that are the same for every time step (in the order of precedence)
+    def _get_constant_headers( self ):
+        return [ self.primary_headers ]
+    
     # function to plot an image step
     def plot( self, step, units='pixels', grid=False, gamma=None, cutoff_percentile=99.9, **kwargs ):
         """
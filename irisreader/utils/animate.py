@@ -10,6 +10,9 @@ import irisreader as ir
 # set a huge animation limit for matplotlib
 matplotlib.rcParams['animation.embed_limit'] = 2**128
 
+# number of image steps that are read at once while the animation is rendered
+ANIMATION_BATCH_STEPS = 50
+
 def animate( data_cube, slit_data=None, slit_cmap="viridis", raster_pos=None, index_start=None, index_stop=None, interval_ms=50, gamma=0.4, figsize=(7,7), cutoff_percentile=99.9, save_path=None ):
     """
     Creates an animation from the individual images of a data cube.
@@ -84,6 +87,14 @@ def animate( data_cube, slit_data=None, slit_cmap="viridis", raster_pos=None, in
         )
         plt.colorbar()
 
+    # read images in batches of consecutive steps (every file is read only once per batch)
+    batch = { 'start': None, 'images': None }
+    def get_image( step ):
+        if batch['start'] is None or not batch['start'] <= step < batch['start'] + len( batch['images'] ):
+            batch['start'] = step
+            batch['images'] = data_cube.get_image_steps( range( step, min( step + ANIMATION_BATCH_STEPS, index_stop ) ), raster_pos=raster_pos )
+        return batch['images'][ step - batch['start'] ]
+
     # do nothing in the initialization function
     def init():
         return im,
@@ -94,7 +105,7 @@ def animate( data_cube, slit_data=None, slit_cmap="viridis", raster_pos=None, in
         ycenix = data_cube.headers[i+index_start]['YCENIX']
         date_obs = data_cube.headers[i+index_start]['DATE_OBS']
         im.axes.set_title( "Frame {}: {}\nXCENIX: {:.3f}, YCENIX: {:.3f}".format( i+index_start, date_obs, xcenix, ycenix ) )
-        im.set_data( data_cube.get_image_step( i+index_start, raster_pos ).clip(min=0.01)**gamma )
+        im.set_data( get_image( i+index_start ).clip(min=0.01)**gamma )
         if slit_data is not None:
             slit_pos = data_cube.get_slit_pos(i)
             line_data = np.vstack([[slit_pos]*image.shape[0], np.arange(image.shape[0])]).T
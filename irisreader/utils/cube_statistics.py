@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+
+"""
+One-pass statistics of iris_data_cube: per-frame and per-pixel aggregates and
+approximate percentiles that are computed while streaming the frames once.
+"""
+
+import os
+import json
+import warnings
+import numpy as np
+import pandas as pd
+
+import irisreader as ir
+
+# data number from which on a pixel is saturated (according to iris_prep.pro)
+SATURATION_DN = 1.6e4
+
+# value of NULL pixels
+NULL_DN = -200
+
+# available per-frame and per-pixel aggregates
+FRAME_STATISTICS = ( 'mean', 'min', 'max', 'nsatpix', 'null_fraction', 'percentiles' )
+PIXEL_STATISTICS = ( 'mean', 'min', 'max', 'nsat', 'null_fraction' )
+
+# maximum number of bytes of image data that are processed at once (if chunk_steps is not given)
+STATISTICS_CHUNK_BYTES = 2**27
+
+
+class quantile_sketch:
+    """
+    Mergeable sketch for approximate quantiles with a relative accuracy
+    guarantee (logarithmic buckets as in DDSketch). A value v with |v| >= min_value
+    is counted in the bucket ceil(log(|v|/min_value) / log gamma) on its side of
+    zero, smaller values are counted in the zero bucket. Every returned quantile
+    has a relative error of at most `relative_accuracy` (an absolute error below
+    min_value for values in the zero bucket).
+
+    A sketch can hold several independent rows (e.g. one per frame) that are
+    updated with a single vectorized bincount.
+
+    Parameters
+    ----------
+    relative_accuracy : float
+        Relative accuracy of the quantiles.
+    min_value : float
+        Smallest absolute value that is resolved.
+    max_value : float
+        Largest absolute value that is resolved (larger values are counted in the outermost bucket).
+    n_rows : int
+        Number of independent rows.
+    """
+
+    # constructor
+    def __init__( self, relative_accuracy=0.01, min_value=1e-3, max_value=1e7, n_rows=1 ):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = ( 1 + relative_accuracy ) / ( 1 - relative_accuracy )
+        self._log_gamma = np.log( self._gamma )
+        self._n_side = int( np.ceil( np.log( max_value / min_value ) / self._log_gamma ) ) + 1
+        self.counts = np.zeros( ( n_rows, 2 * self._n_side + 1 ), dtype=np.int64 )
+
+    @property
+    def n_buckets( self ):
+        return self.counts.shape[1]
+
+    # function to convert values to bucket numbers (negative values below, positive values above the zero bucket)
+    def _buckets( self, values ):
+        magnitude = np.abs( values ).astype( np.float64 ) / self.min_value
+        k = np.zeros( magnitude.shape, dtype=np.int64 )
+        large = magnitude >= 1
+        k[large] = np.minimum( np.ceil( np.log( magnitude[large] ) / self._log_gamma ), self._n_side - 1 ).astype( np.int64 ) + 1
+        return self._n_side + np.where( values < 0, -k, k )
+
+    # function to get the representative value of the buckets
+    def _bucket_values( self ):
+        k = np.arange( -self._n_side, self._n_side + 1 )
+        magnitude = np.where( k == 0, 0, 2 * self.min_value * self._gamma ** ( np.abs( k ) - 1 ) / ( 1 + self._gamma ) )
+        return np.sign( k ) * magnitude
+
+    def add( self, values, rows=None ):
+        """
+        Adds values to the sketch.
+
+        Parameters
+        ----------
+        values : numpy.ndarray
+            Values to add.
+        rows : numpy.ndarray
+            Row of every value (all values are added to row 0 if None).
+        """
+        buckets = self._buckets( np.asarray( values ).reshape(-1) )
+        if rows is not None:
+            buckets = buckets + np.asarray( rows ).reshape(-1) * self.n_buckets
+        self.counts += np.bincount( buckets, minlength=self.counts.size ).reshape( self.counts.shape )
+
+    def merge( self, other ):
+        """
+        Merges the counts of another sketch with the same parameters into this sketch.
+        """
+        self.counts += other.counts
+
+    def quantiles( self, q ):
+        """
+        Returns approximate quantiles of every row.
+
+        Parameters
+        ----------
+        q : list
+            Quantiles between 0 and 1.
+
+        Returns
+        -------
+        numpy.ndarray :
+            Array with shape (n_rows, len(q)), NaN for empty rows.
+        """
+        q = np.atleast_1d( q )
+        cumulative = np.cumsum( self.counts, axis=1 )
+        totals = cumulative[:,-1]
+
+        # first bucket in which the rank of the quantile is reached
+        ranks = q[np.newaxis,:] * np.maximum( totals - 1, 0 )[:,np.newaxis]
+        buckets = np.stack( [ np.sum( cumulative <= ranks[:,i:i+1], axis=1 ) for i in range( len( q ) ) ], axis=1 )
+        values = self._bucket_values()[ np.minimum( buckets, self.n_buckets - 1 ) ]
+        values[ totals == 0 ] = np.nan
+        return values
+
+
+class cube_statistics:
+    """
+    Result of iris_data_cube.get_statistics.
+
+    Attributes
+    ----------
+    frame : pandas.DataFrame
+        Per-frame statistics with one row per time step. Columns: mean, min, max
+        (of the non-null pixels), nsatpix (number of saturated pixels), null_fraction
+        (fraction of NULL pixels) and p<q> for every requested percentile q.
+    pixel : dict
+        Per-pixel statistics over time (numpy arrays with the image shape): mean,
+        min, max (of the non-null values), nsat (number of saturated frames) and
+        null_fraction (fraction of frames in which the pixel is NULL).
+    percentiles : dict
+        Approximate percentiles of all non-null pixels of the data cube (percentile -> value).
+    """
+
+    # constructor
+    def __init__( self, frame, pixel, percentiles ):
+        self.frame = frame
+        self.pixel = pixel
+        self.percentiles = percentiles
+
+    def __repr__( self ):
+        return "cube_statistics<frame columns={}, pixel statistics={}, percentiles={}>".format( list( self.frame.columns ), list( self.pixel.keys() ), self.percentiles )
+
+
+# function to compute the statistics of a data cube in one pass
+def compute_statistics( data_cube, frame_statistics=FRAME_STATISTICS, pixel_statistics=PIXEL_STATISTICS, percentiles=(1, 50, 99), relative_accuracy=0.01, chunk_steps=None ):
+    """
+    Computes per-frame and per-pixel statistics of a data cube while streaming
+    its frames once (with iris_data_cube.iter_chunks). Percentiles are
+    approximated with quantile sketches that are updated frame by frame. NULL
+    pixels (-200) are excluded from means, minima, maxima and percentiles.
+    Sums are accumulated in float64 without copying the data.
+
+    Parameters
+    ----------
+    data_cube : iris_data_cube
+        Data cube.
+    frame_statistics : tuple
+        Per-frame statistics to compute (subset of FRAME_STATISTICS).
+    pixel_statistics : tuple
+        Per-pixel statistics to compute (subset of PIXEL_STATISTICS).
+    percentiles : tuple
+        Percentiles (between 0 and 100) for the per-frame and the cube percentiles.
+    relative_accuracy : float
+        Relative accuracy of the percentile sketches.
+    chunk_steps : int
+        Number of image steps that are processed at once (defaults to as many
+        as fit into STATISTICS_CHUNK_BYTES).
+
+    Returns
+    -------
+    cube_statistics :
+        Per-frame, per-pixel and cube statistics.
+    """
+
+    for statistic in frame_statistics:
+        if statistic not in FRAME_STATISTICS:
+            raise ValueError( "Unknown frame statistic '{}' (available: {})".format( statistic, ", ".join( FRAME_STATISTICS ) ) )
+    for statistic in pixel_statistics:
+        if statistic not in PIXEL_STATISTICS:
+            raise ValueError( "Unknown pixel statistic '{}' (available: {})".format( statistic, ", ".join( PIXEL_STATISTICS ) ) )
+
+    n_steps = data_cube.n_steps
+    image_shape = tuple( int( n ) for n in data_cube.shape[1:] )
+    n_pixels = int( np.prod( image_shape ) )
+    q = np.array( percentiles, dtype=np.float64 ) / 100
+    with_frame_percentiles = 'percentiles' in frame_statistics and len( q ) > 0
+    if chunk_steps is None:
+        chunk_steps = max( 1, STATISTICS_CHUNK_BYTES // ( max( n_pixels, 1 ) * 4 ) )
+
+    # per-frame accumulators
+    frame = { key: np.zeros( n_steps ) for key in [ 'sum', 'count', 'min', 'max', 'nsatpix' ] }
+    frame_percentiles = np.zeros( ( n_steps, len( q ) ) )
+    cube_sketch = quantile_sketch( relative_accuracy )
+
+    # per-pixel accumulators
+    pixel_sum = np.zeros( image_shape )
+    pixel_count = np.zeros( image_shape, dtype=np.int64 )
+    pixel_min = np.full( image_shape, np.inf )
+    pixel_max = np.full( image_shape, -np.inf )
+    pixel_nsat = np.zeros( image_shape, dtype=np.int64 )
+
+    if ir.config.verbosity_level >= 2: print("[iris_data_cube] Computing statistics of {} image steps".format( n_steps ) )
+
+    for steps, data, _ in data_cube.iter_chunks( chunk_steps, with_headers=False ):
+        valid = data != NULL_DN
+        saturated = data >= SATURATION_DN
+
+        # per-frame aggregates of the non-null pixels (sums are accumulated in float64 without a float64 copy of the data)
+        frame['count'][steps] = np.sum( valid, axis=(1,2) )
+        frame['sum'][steps] = np.sum( data, axis=(1,2), where=valid, dtype=np.float64 )
+        frame['min'][steps] = np.min( data, axis=(1,2), where=valid, initial=np.inf )
+        frame['max'][steps] = np.max( data, axis=(1,2), where=valid, initial=-np.inf )
+        frame['nsatpix'][steps] = np.sum( saturated, axis=(1,2) )
+
+        # percentiles: sketch frame by frame (per-frame percentiles only if requested), merged into the cube sketch
+        if len( q ) > 0:
+            frame_sketch = quantile_sketch( relative_accuracy )
+            for i, step in enumerate( steps ):
+                frame_sketch.counts[...] = 0
+                frame_sketch.add( data[i][valid[i]] )
+                if with_frame_percentiles:
+                    frame_percentiles[step] = frame_sketch.quantiles( q )[0]
+                cube_sketch.merge( frame_sketch )
+
+        # per-pixel aggregates over time
+        if len( pixel_statistics ) > 0:
+            pixel_sum += np.sum( data, axis=0, where=valid, dtype=np.float64 )
+            pixel_count += np.sum( valid, axis=0 )
+            pixel_min = np.minimum( pixel_min, np.min( data, axis=0, where=valid, initial=np.inf ) )
+            pixel_max = np.maximum( pixel_max, np.max( data, axis=0, where=valid, initial=-np.inf ) )
+            pixel_nsat += np.sum( saturated, axis=0 )
+
+    # assemble the per-frame table
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        columns = {
+            'mean': frame['sum'] / frame['count'],
+            'min': np.where( frame['count'] > 0, frame['min'], np.nan ),
+            'max': np.where( frame['count'] > 0, frame['max'], np.nan ),
+            'nsatpix': frame['nsatpix'].astype( np.int64 ),
+            'null_fraction': 1 - frame['count'] / max( n_pixels, 1 )
+        }
+    table = pd.DataFrame( { key: value for key, value in columns.items() if key in frame_statistics } )
+    if 'percentiles' in frame_statistics:
+        for i, percentile in enumerate( percentiles ):
+            table['p{:g}'.format( percentile )] = frame_percentiles[:,i]
+
+    # assemble the per-pixel statistics
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        pixel = {
+            'mean': pixel_sum / pixel_count,
+            'min': np.where( pixel_count > 0, pixel_min, np.nan ),
+            'max': np.where( pixel_count > 0, pixel_max, np.nan ),
+            'nsat': pixel_nsat,
+            'null_fraction': 1 - pixel_count / max( n_steps, 1 )
+        }
+    pixel = { key: value for key, value in pixel.items() if key in pixel_statistics }
+
+    cube_percentiles = dict( zip( percentiles, cube_sketch.quantiles( q )[0].tolist() ) )
+    return cube_statistics( table, pixel, cube_percentiles )
+
+
+# function to get the path of the statistics cache (next to the valid steps cache)
+def _get_cache_path( files, variant ):
+    if ir.config.valid_steps_cache == 'npy':
+        return "{}/.statistics_{}.npz".format( os.path.dirname( files[0] ), variant )
+    elif ir.config.valid_steps_cache == 'sqlite':
+        return "{}/statistics/{}_{}.npz".format( os.path.dirname( os.path.expanduser( ir.config.valid_steps_db_path ) ), os.path.basename( files[0] ), variant )
+    else:
+        return None
+
+# function to get the fingerprints (names, sizes and modification times) of files
+def _get_fingerprints( files ):
+    stats = [ os.stat( file ) for file in files ]
+    return np.array( [ os.path.basename( file ) for file in files ] ), np.array( [ stat.st_size for stat in stats ], dtype=np.int64 ), np.array( [ stat.st_mtime_ns for stat in stats ], dtype=np.int64 )
+
+def load_statistics( files, variant, valid_steps, options ):
+    """
+    Loads cached statistics. They are only used if the files, the valid steps
+    and the options (statistics, percentiles, bounds etc.) did not change.
+
+    Parameters
+    ----------
+    files : list
+        List of FITS file paths
+    variant : str
+        Identifier of the line and null mode
+    valid_steps : numpy.ndarray
+        Valid steps of the data cube
+    options : dict
+        Options the statistics were computed with
+
+    Returns
+    -------
+    cube_statistics :
+        Cached statistics or None if there are no (valid) cached statistics.
+    """
+    path = _get_cache_path( files, variant )
+    if path is None or not os.path.exists( path ):
+        return None
+
+    try:
+        with np.load( path, allow_pickle=False ) as cache:
+            names, sizes, mtimes = _get_fingerprints( files )
+            if not ( np.array_equal( cache['names'], names ) and np.array_equal( cache['sizes'], sizes ) and np.array_equal( cache['mtimes'], mtimes )
+                     and np.array_equal( cache['valid_steps'], valid_steps ) and str( cache['options'] ) == json.dumps( options ) ):
+                return None
+
+            frame_columns = json.loads( str( cache['frame_columns'] ) )
+            frame = pd.DataFrame( { column: cache['frame_' + column] for column in frame_columns } )
+            pixel = { key: cache['pixel_' + key] for key in json.loads( str( cache['pixel_keys'] ) ) }
+            percentiles = dict( zip( options['percentiles'], cache['percentiles'].tolist() ) )
+
+    except Exception as e:
+        warnings.warn( "Could not load statistics from {} ({})".format( path, e ) )
+        return None
+
+    if ir.config.verbosity_level >= 2: print("[iris_data_cube] using precomputed statistics from {}".format( path ) )
+    return cube_statistics( frame, pixel, percentiles )
+
+def store_statistics( files, variant, valid_steps, options, statistics ):
+    """
+    Stores statistics next to the valid steps cache.
+
+    Parameters
+    ----------
+    files : list
+        List of FITS file paths
+    variant : str
+        Identifier of the line and null mode
+    valid_steps : numpy.ndarray
+        Valid steps of the data cube
+    options : dict
+        Options the statistics were computed with
+    statistics : cube_statistics
+        Statistics to store
+    """
+    path = _get_cache_path( files, variant )
+    if path is None:
+        return
+
+    tmp_path = "{}.{}.tmp".format( path, os.getpid() )
+    try:
+        names, sizes, mtimes = _get_fingerprints( files )
+        cache = {
+            'names': names, 'sizes': sizes, 'mtimes': mtimes,
+            'valid_steps': valid_steps,
+            'options': np.array( json.dumps( options ) ),
+            'frame_columns': np.array( json.dumps( list( statistics.frame.columns ) ) ),
+            'pixel_keys': np.array( json.dumps( list( statistics.pixel.keys() ) ) ),
+            'percentiles': np.array( list( statistics.percentiles.values() ), dtype=np.float64 )
+        }
+        cache.update( { 'frame_' + column: statistics.frame[column].values for column in statistics.frame.columns } )
+        cache.update( { 'pixel_' + key: value for key, value in statistics.pixel.items() } )
+
+        # write to a temporary file first, such that concurrent readers never see a partial cache
+        os.makedirs( os.path.dirname( path ), exist_ok=True )
+        with open( tmp_path, 'wb' ) as f:
+            np.savez( f, **cache )
+        os.replace( tmp_path, path )
+
+    except Exception as e:
+        if os.path.exists( tmp_path ):
+            os.remove( tmp_path )
+        if ir.config.verbosity_level >= 2: print("[iris_data_cube] Could not store statistics ({})".format( e ) )
@@ -2,6 +2,7 @@
 
 # This file contains date utility functions
 
+import numpy as np
 from datetime import datetime as dt
 from datetime import timedelta
 
@@ -53,6 +54,53 @@ def to_Tformat( date, milliseconds=True ):
         date_str = dt.strftime( date + timedelta( seconds=round(microseconds) ) , T_FORMAT_S )
     return date_str
 
+def add_seconds( date_str, seconds ):
+    """
+    Adds an array of seconds to a FITS date. This is a vectorized version of 
+    from_Tformat( date_str ) + timedelta( seconds=s ) that rounds to 
+    microseconds exactly like timedelta.
+    
+    Parameters
+    ----------
+    date_str : str
+        FITS date string with 'T' between date and time.
+    seconds : numpy.ndarray
+        Seconds to add to the date.
+    
+    Returns
+    -------
+    numpy.ndarray :
+        Array with dates (dtype datetime64[us]).
+    """
+    start = np.datetime64( from_Tformat( date_str ), 'us' )
+    
+    # round to microseconds like timedelta does (whole and fractional seconds separately)
+    seconds = np.asarray( seconds, dtype=float )
+    whole_seconds = np.trunc( seconds )
+    microseconds = whole_seconds.astype( np.int64 ) * 1000000 + np.round( ( seconds - whole_seconds ) * 1e6 ).astype( np.int64 )
+    return start + microseconds.astype( 'timedelta64[us]' )
+
+def add_seconds_Tformat( date_str, seconds ):
+    """
+    Adds an array of seconds to a FITS date and converts the results to the 
+    FITS date format (with milliseconds). This is a vectorized version of 
+    to_Tformat( from_Tformat( date_str ) + timedelta( seconds=s ) ).
+    
+    Parameters
+    ----------
+    date_str : str
+        FITS date string with 'T' between date and time.
+    seconds : numpy.ndarray
+        Seconds to add to the date.
+    
+    Returns
+    -------
+    numpy.ndarray :
+        Array (dtype object) with FITS date strings.
+    """
+    dates = add_seconds( date_str, seconds ).astype( 'datetime64[ms]' )
+    return np.datetime_as_string( dates, unit='ms' ).astype( object )
+
 def from_obsformat( full_obsid_str ):
     """
     Converts a full OBSID string to a date.
@@ -88,3 +136,19 @@ def to_epoch( date ):
     """
     return (date - dt.utcfromtimestamp(0)).total_seconds()
 
+def to_epoch_array( dates ):
+    """
+    Converts an array of dates to the number of seconds since 1.1.1970.
+    This is a vectorized version of to_epoch.
+    
+    Parameters
+    ----------
+    dates : numpy.ndarray
+        Array with dates (dtype datetime64)
+        
+    Returns
+    -------
+    numpy.ndarray :
+        Seconds since 1.1.1970 00:00:00 (dtype float64)
+    """
+    return ( dates - np.datetime64( '1970-01-01T00:00:00', 'us' ) ) / np.timedelta64( 1, 's' )
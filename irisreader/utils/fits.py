@@ -1,5 +1,16 @@
 #!/usr/bin/env python3
 
+import os
+import gzip
+import numpy as np
+from astropy.io import fits
+
+# value of null pixels in IRIS images
+NULL_VALUE = -200
+
+# default memory budget for a single read when searching null frames (64 MB)
+NULL_SCAN_CHUNK_BYTES = 2**26
+
 # exception class for corrupt FITS files
 class CorruptFITSException( Exception ):
     pass
@@ -39,6 +50,90 @@ def line2extension( header, line ):
     else:
         return line_descriptions.index( res[0] ) + 1
 
+# function to convert the line description of a SJI into the actual line description
+def sji_line_description( description ):
+    """
+    Replaces the SJI filter name in a line description (TDESC header) by the
+    actual line description, e.g. 'SJI_1400' by 'Si IV 1400'.
+    
+    Parameters
+    ----------
+    description : str
+        Line description from the TDESC header
+    
+    Returns
+    -------
+    str :
+        Line description
+    """
+    description = description.replace( 'SJI_1330', 'C II 1330' )
+    description = description.replace( 'SJI_1400', 'Si IV 1400' )
+    description = description.replace( 'SJI_2796', 'Mg II h/k 2796' )
+    description = description.replace( 'SJI_2832', 'Mg II wing 2832' )
+    return description
+
+# function to get the size of the data block that follows a header
+def get_data_size( header ):
+    """
+    Returns the size in bytes of the (padded) data block that belongs to a header.
+    
+    Parameters
+    ----------
+    header : astropy.io.fits.header.Header
+        Header of an HDU
+    
+    Returns
+    -------
+    int :
+        Size of the data block including the padding to a multiple of 2880 bytes
+    """
+    n_axis = header.get( 'NAXIS', 0 )
+    if n_axis == 0:
+        return 0
+    
+    # random groups have NAXIS1 = 0 which does not count
+    axes = [ header['NAXIS{}'.format(i)] for i in range( 1, n_axis+1 ) ]
+    if header.get( 'GROUPS', False ) and axes[0] == 0:
+        axes = axes[1:]
+    n_values = int( np.prod( axes ) )
+    size = abs( header['BITPIX'] ) // 8 * header.get( 'GCOUNT', 1 ) * ( header.get( 'PCOUNT', 0 ) + n_values )
+    return ( size + 2879 ) // 2880 * 2880
+
+# function to read the headers of a FITS file without reading any data
+def read_headers( path, n_headers=None ):
+    """
+    Reads the headers of a FITS file without reading its data: the data block
+    behind every header is skipped by seeking past it. No data is loaded and
+    the file is not verified.
+    
+    Parameters
+    ----------
+    path : str
+        Path to the FITS file (may be gzip-compressed)
+    n_headers : int
+        Number of headers to read (all if None), e.g. 1 for the primary header only
+    
+    Returns
+    -------
+    list :
+        List with the astropy.io.fits.header.Header of every read HDU
+    """
+    
+    headers = []
+    with ( gzip.open( path, 'rb' ) if path.endswith( '.gz' ) else open( path, 'rb' ) ) as f:
+        while n_headers is None or len( headers ) < n_headers:
+            try:
+                header = fits.Header.fromfile( f )
+            except EOFError:
+                break
+            headers.append( header )
+            f.seek( get_data_size( header ), os.SEEK_CUR )
+    
+    if len( headers ) == 0:
+        raise CorruptFITSException( "{} contains no FITS headers.".format( path ) )
+    
+    return headers
+
 # function to translate headers stored in a data array
 def array2dict( header, data ):
     """
@@ -71,5 +166,106 @@ def array2dict( header, data ):
 
     return res
 
-        
+# function to translate headers stored in a data array into columns
+def array2columns( header, data ):
+    """
+    Reads (key, index) pairs from the header of the extension and uses them
+    to assign each column of the data array to a key. In contrast to array2dict,
+    no dictionary is created for every row.
+    
+    Parameters
+    ----------
+    header : astropy.io.fits.header.Header
+        Header with the keys to the data array
+    data : numpy.ndarray
+        Data array
 
+    Returns
+    -------
+    dict :
+        Dictionary with a column (numpy.ndarray) for every key
+    """
+    
+    # some headers are not keys but real headers: remove them
+    keys_to_remove=['XTENSION', 'BITPIX', 'NAXIS', 'NAXIS1', 'NAXIS2', 'PCOUNT', 'GCOUNT']
+    header_keys = dict( header )
+    header_keys = {k: v for k, v in header_keys.items() if k not in keys_to_remove}
+    
+    # copy the data such that the columns do not refer to the file anymore
+    data = np.array( data )
+    
+    return { key: data[:,index] for key, index in header_keys.items() }
+
+# function to find frames that are null everywhere
+def get_null_frames( hdu, use_section=False, chunk_bytes=NULL_SCAN_CHUNK_BYTES ):
+    """
+    Returns per-frame flags that indicate whether a frame of a three-dimensional
+    data extension is NULL (-200) everywhere.
+    
+    Without the section interface, the flags are computed with one vectorized
+    reduction per block of frames. With the section interface (memory mapping), 
+    frames are read in blocks of rows and a frame is not read any further 
+    once a block with a non-null value has been found. In both cases a single 
+    read never exceeds roughly `chunk_bytes`.
+    
+    Parameters
+    ----------
+    hdu : astropy.io.fits.ImageHDU
+        Data extension with a data cube of format [step,y,x]
+    use_section : bool
+        Whether to read through the section interface (memory mapping) or the data interface
+    chunk_bytes : int
+        Approximate maximum number of bytes read at once
+
+    Returns
+    -------
+    numpy.ndarray :
+        Boolean array of length hdu.shape[0], True for frames that are null everywhere
+    """
+    
+    n_frames, n_y, n_x = hdu.shape
+    is_null = np.zeros( n_frames, dtype=bool )
+    if n_frames == 0 or n_y * n_x == 0:
+        is_null[:] = True
+        return is_null
+    
+    # estimate bytes per pixel conservatively (scaled data is returned as float64)
+    pixel_bytes = 8
+    
+    # data interface: whole frames, blocks of frames
+    if not use_section:
+        data = hdu.data
+        frames_per_chunk = max( 1, chunk_bytes // ( n_y * n_x * pixel_bytes ) )
+        for start in range( 0, n_frames, frames_per_chunk ):
+            stop = min( start + frames_per_chunk, n_frames )
+            is_null[start:stop] = np.all( data[start:stop] == NULL_VALUE, axis=(1,2) )
+        return is_null
+    
+    # section interface: blocks of rows for blocks of frames, frames with a 
+    # non-null value are dropped from the candidates after every block of rows
+    # (blocks are visited from the center of the image outwards, where data is most likely)
+    rows_per_block = max( 1, n_y // 8 )
+    row_blocks = [ (y0, min( y0 + rows_per_block, n_y )) for y0 in range( 0, n_y, rows_per_block ) ]
+    row_blocks = sorted( row_blocks, key=lambda block: abs( block[0] + block[1] - n_y ) )
+    frames_per_chunk = max( 1, chunk_bytes // ( rows_per_block * n_x * pixel_bytes ) )
+    
+    for start in range( 0, n_frames, frames_per_chunk ):
+        stop = min( start + frames_per_chunk, n_frames )
+        candidates = np.arange( start, stop )
+        
+        for y0, y1 in row_blocks:
+            
+            # read the range spanned by the remaining candidates if they are dense, otherwise read them one by one
+            first, last = candidates[0], candidates[-1] + 1
+            if 2 * len( candidates ) >= last - first:
+                block = hdu.section[first:last, y0:y1, :][candidates - first]
+            else:
+                block = np.stack( [ hdu.section[candidate, y0:y1, :] for candidate in candidates ] )
+            
+            candidates = candidates[ np.all( block == NULL_VALUE, axis=(1,2) ) ]
+            if len( candidates ) == 0:
+                break
+                
+        is_null[candidates] = True
+            
+    return is_null
@@ -125,6 +125,7 @@ def get_mg2k_features(nprof, dn_nprof, verbose=True):
 def profile_rep( data ):
     '''
     [steps, rasters, y, lamda] -> [m_example, lambda]
+    (data in this format can be obtained with raster_cube.get_sweep_data)
     '''
     data_transposed = np.transpose(data, (1,0,2,3))
     nprof = data_transposed.reshape( data.shape[0] * data.shape[1] * data.shape[2], data.shape[3], order='C' )
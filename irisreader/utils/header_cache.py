@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+On-disk cache for the time-specific header columns of IRIS FITS files.
+
+Every file is cached in a single .npy file whose name is derived from the file
+fingerprint (real path, size and modification time). The columns are stored
+one after another as fields of a structured array with a single record, such
+that every column is a contiguous block. Entries are read completely and the
+cache file is closed right away (no file handles are kept open outside of
+the file hub). The cache directory is set with ir.config.header_cache_dir.
+"""
+
+import os
+import hashlib
+import warnings
+import numpy as np
+
+import irisreader as ir
+from irisreader.utils.valid_steps_cache import file_fingerprint
+
+# function to create the header cache if it is enabled in ir.config
+def get_header_cache():
+    """
+    Returns the header cache in ir.config.header_cache_dir.
+
+    Returns
+    -------
+    header_cache / None :
+        Header cache or None if caching is disabled.
+    """
+    if ir.config.header_cache_dir is None:
+        return None
+    else:
+        return header_cache( ir.config.header_cache_dir )
+
+
+class header_cache:
+    """
+    Cache that stores the time-specific header columns of every file in a
+    file <fingerprint hash>.npy in the given directory. Entries of files that
+    changed are never found again, since the size and the modification time
+    are part of the fingerprint.
+
+    Parameters
+    ----------
+    directory : str
+        Directory of the cache
+    """
+
+    def __init__( self, directory ):
+        self.directory = os.path.expanduser( directory )
+
+    def _get_path( self, file ):
+        fingerprint = "{}|{}|{}".format( *file_fingerprint( file ) )
+        return "{}/{}.npy".format( self.directory, hashlib.sha1( fingerprint.encode() ).hexdigest() )
+
+    def load( self, file ):
+        """
+        Loads the time-specific header columns of a file.
+
+        Parameters
+        ----------
+        file : str
+            Path to the FITS file
+
+        Returns
+        -------
+        dict :
+            Dictionary with a column (numpy.ndarray) for every key or None if the file is not cached
+        """
+        path = self._get_path( file )
+        if not os.path.exists( path ):
+            return None
+
+        try:
+            # read the record into memory: a memory map would keep the cache file open
+            record = np.load( path )[0]
+        except Exception as e:
+            warnings.warn( "Could not load cached headers from {} ({})".format( path, e ) )
+            return None
+
+        if ir.config.verbosity_level >= 3: print("[header cache] using cached headers for {}".format( file ) )
+        return { key: np.array( record[key] ) for key in record.dtype.names }
+
+    def store( self, file, columns ):
+        """
+        Stores the time-specific header columns of a file.
+
+        Parameters
+        ----------
+        file : str
+            Path to the FITS file
+        columns : dict
+            Dictionary with a column (numpy.ndarray) for every key
+        """
+        path = self._get_path( file )
+        tmp_path = "{}.{}.tmp".format( path, os.getpid() )
+        try:
+            # one record with a field per column: every column is stored contiguously
+            dtype = np.dtype( [ ( key, column.dtype, column.shape ) for key, column in columns.items() ] )
+            record = np.empty( 1, dtype=dtype )
+            for key, column in columns.items():
+                record[0][key] = column
+
+            # write to a temporary file first, such that concurrent readers never see a partial cache
+            os.makedirs( self.directory, exist_ok=True )
+            with open( tmp_path, 'wb' ) as f:
+                np.save( f, record )
+            os.replace( tmp_path, path )
+
+        except Exception as e:
+            if os.path.exists( tmp_path ):
+                os.remove( tmp_path )
+            if ir.config.verbosity_level >= 2: print("[header cache] Could not store headers of {} ({})".format( file, e ) )
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+from collections.abc import Mapping
+
+class header_layers:
+    """
+    This class holds the header layers that are shared by all frames of a
+    file: the time-specific header columns of the file, the combined header
+    keys that are copies of time-specific keys (aliases) and the headers that
+    are the same for every frame (e.g. primary and line-specific headers).
+
+    Parameters
+    ----------
+    columns : dict
+        Time-specific header columns of the file (key -> numpy.ndarray)
+    aliases : dict
+        Combined header keys that are copies of time-specific keys (key -> time-specific key)
+    constant_headers : list
+        Header dictionaries that are the same for every frame (in the order of precedence)
+    """
+
+    __slots__ = ( 'columns', 'aliases', 'constant_headers', 'keys' )
+
+    # constructor
+    def __init__( self, columns, aliases, constant_headers ):
+        self.columns = columns
+        self.aliases = { key: column_key for key, column_key in aliases.items() if column_key in columns }
+        self.constant_headers = constant_headers
+
+        # key order of a merged dictionary: constant headers (lowest precedence first), time-specific headers and aliases
+        keys = {}
+        for headers in reversed( constant_headers ):
+            keys.update( dict.fromkeys( headers ) )
+        keys.update( dict.fromkeys( columns ) )
+        keys.update( dict.fromkeys( self.aliases ) )
+        self.keys = tuple( keys )
+
+
+class layered_header( Mapping ):
+    """
+    This class represents the combined header of a single frame as a read-only
+    dictionary. Instead of copying the primary and line-specific headers into
+    every frame, the layers are shared by all frames of a file and only the row
+    of the frame in the time-specific header columns is stored. Values are
+    looked up in the order aliases, time-specific headers, constant headers.
+    
+    Note that combined headers are read-only mappings and not dictionaries:
+    isinstance( header, dict ) is False, there is no `update` and functions 
+    that require a dictionary (e.g. json.dumps) need a copy that is created
+    with `copy()` or dict( header ).
+
+    Parameters
+    ----------
+    layers : header_layers
+        Header layers of the file
+    row : int
+        Row of the frame in the time-specific header columns
+    """
+
+    __slots__ = ( '_layers', '_row' )
+
+    # constructor
+    def __init__( self, layers, row ):
+        self._layers = layers
+        self._row = row
+
+    # look up a key in the layers
+    def __getitem__( self, key ):
+        layers = self._layers
+        key = layers.aliases.get( key, key )
+
+        if key in layers.columns:
+            return layers.columns[key][ self._row ]
+
+        for headers in layers.constant_headers:
+            if key in headers:
+                return headers[key]
+
+        raise KeyError( key )
+
+    def __iter__( self ):
+        return iter( self._layers.keys )
+
+    def __len__( self ):
+        return len( self._layers.keys )
+
+    def __contains__( self, key ):
+        layers = self._layers
+        return key in layers.columns or key in layers.aliases or any( key in headers for headers in layers.constant_headers )
+
+    # get a modifiable copy
+    def copy( self ):
+        """
+        Returns the combined header as a dictionary.
+
+        Returns
+        -------
+        dict :
+            Dictionary with all header keys and values
+        """
+        return dict( self )
+
+    # headers are read-only: give a hint how to get a modifiable copy
+    def __setitem__( self, key, value ):
+        raise TypeError( "Combined headers are read-only, please use header.copy() to get a modifiable copy" )
+
+    def __repr__( self ):
+        return repr( dict( self ) )
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""
+lazy_array class: numpy-like facade over iris_data_cube that only reads data
+when it is indexed or reduced
+"""
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+class lazy_array:
+    """
+    This class exposes a data cube as a lazy three-dimensional array with shape
+    and dtype. Indexing reads only the files that are required, indexing only
+    the time axis with a slice returns another lazy array. Reductions (sum,
+    mean, min, max) and map_blocks are computed blockwise on chunks of image
+    steps that are read and processed on a local thread pool, such that
+    whole-cube statistics never need to load the whole cube into memory.
+
+    Parameters
+    ----------
+    data_cube : iris_data_cube
+        Data cube to wrap.
+    steps : numpy.ndarray
+        Time steps of the data cube that are part of the array (all if None).
+    chunk_steps : int
+        Number of image steps per chunk.
+    n_workers : int
+        Number of threads that read and process chunks.
+    """
+
+    # constructor
+    def __init__( self, data_cube, steps=None, chunk_steps=100, n_workers=4 ):
+        self._data_cube = data_cube
+        self._steps = np.arange( data_cube.n_steps ) if steps is None else np.asarray( steps, dtype=int )
+        self.chunk_steps = chunk_steps
+        self.n_workers = n_workers
+
+    @property
+    def shape( self ):
+        return tuple( [ len( self._steps ) ] + [ int( n ) for n in self._data_cube.shape[1:] ] )
+
+    @property
+    def ndim( self ):
+        return 3
+
+    @property
+    def size( self ):
+        return int( np.prod( self.shape ) )
+
+    # the data cube returns images as native float32 on every access path
+    @property
+    def dtype( self ):
+        return np.dtype( np.float32 )
+
+    @property
+    def chunks( self ):
+        """
+        List with the time steps of every chunk (positions in this array).
+        """
+        return [ np.arange( start, min( start + self.chunk_steps, len( self._steps ) ) ) for start in range( 0, len( self._steps ), self.chunk_steps ) ]
+
+    def __len__( self ):
+        return len( self._steps )
+
+    def __repr__( self ):
+        return "lazy_array<shape={}, chunk_steps={}>".format( self.shape, self.chunk_steps )
+
+    # convert index to a three-dimensional index (expand ellipsis and missing indices)
+    def _expand_index( self, index ):
+        if not isinstance( index, tuple ):
+            index = ( index, )
+
+        if any( i is Ellipsis for i in index ):
+            position = [ i is Ellipsis for i in index ].index( True )
+            index = index[:position] + ( slice( None ), ) * ( 3 - len( index ) + 1 ) + index[position+1:]
+
+        if len( index ) > 3:
+            raise IndexError( "too many indices for array: array is 3-dimensional, but {} were indexed".format( len( index ) ) )
+
+        return index + ( slice( None ), ) * ( 3 - len( index ) )
+
+    # slicing: time slices stay lazy, everything else is read
+    def __getitem__( self, index ):
+        index = self._expand_index( index )
+
+        # only the time axis is sliced: return a lazy array again
+        if isinstance( index[0], slice ) and all( isinstance( i, slice ) and i == slice( None ) for i in index[1:] ):
+            return lazy_array( self._data_cube, self._steps[ index[0] ], chunk_steps=self.chunk_steps, n_workers=self.n_workers )
+
+        steps = self._steps[ index[0] ]
+
+        # advanced indices on the image axes of several steps cannot be passed on to the data cube: read the involved
+        # images first and index them afterwards (advanced time indices are broadcast against the image indices)
+        if np.ndim( steps ) > 0 and any( np.ndim( i ) > 0 for i in index[1:] if not isinstance( i, slice ) ):
+            if isinstance( index[0], slice ):
+                return self._data_cube.get_image_steps( steps )[ ( slice( None ), index[1], index[2] ) ]
+            unique_steps, positions = np.unique( steps, return_inverse=True )
+            return self._data_cube.get_image_steps( unique_steps )[ ( positions.reshape( np.shape( steps ) ), index[1], index[2] ) ]
+
+        data = self._data_cube.get_data( ( steps, index[1], index[2] ) )
+
+        # the data cube removes the time axis if only one step is selected: give the output the shape numpy would give it
+        # (indexing a broadcast view does not allocate the data)
+        shape = np.broadcast_to( np.empty( (), dtype=bool ), self.shape )[ index ].shape
+        return data.reshape( shape )
+
+    # read everything
+    def compute( self ):
+        """
+        Reads the whole array into memory.
+
+        Returns
+        -------
+        numpy.ndarray :
+            Data with format [step,y,x] (SJI), [step,y,wavelength] (raster).
+        """
+        return self._data_cube.get_image_steps( self._steps )
+
+    def __array__( self, dtype=None, copy=None ):
+        data = self.compute()
+        return data if dtype is None else data.astype( dtype )
+
+    # apply a function to every chunk in parallel (results are returned in chunk order)
+    def _map_chunks( self, func ):
+        def process( chunk ):
+            return func( self._data_cube.get_image_steps( self._steps[ chunk ] ) )
+
+        if self.n_workers > 1:
+            with ThreadPoolExecutor( max_workers=self.n_workers ) as pool:
+                return list( pool.map( process, self.chunks ) )
+        else:
+            return [ process( chunk ) for chunk in self.chunks ]
+
+    def map_blocks( self, func ):
+        """
+        Applies a function to every chunk of image steps and concatenates the
+        results along the first axis.
+
+        Parameters
+        ----------
+        func : function
+            Function that takes an array [step,y,x] and returns an array whose
+            first axis corresponds to the steps (e.g. lambda x: x.max(axis=(1,2)))
+
+        Returns
+        -------
+        numpy.ndarray :
+            Concatenated results.
+        """
+        return np.concatenate( self._map_chunks( func ) )
+
+    # compute a reduction blockwise
+    def _reduce( self, func, axis, **kwargs ):
+        axes = tuple( range( 3 ) ) if axis is None else tuple( np.atleast_1d( axis ) % 3 )
+        results = self._map_chunks( lambda data: func( data, axis=axes, **kwargs ) )
+
+        # the time axis is not reduced: concatenate the chunks, otherwise reduce chunk results again
+        if 0 not in axes:
+            return np.concatenate( results )
+        else:
+            return func( np.stack( results ), axis=0, **kwargs )
+
+    def sum( self, axis=None, dtype=None ):
+        """
+        Computes the sum over the given axes blockwise.
+
+        Parameters
+        ----------
+        axis : int / tuple
+            Axis or axes along which to sum (all if None).
+        dtype : numpy.dtype
+            Type of the accumulator.
+
+        Returns
+        -------
+        numpy.ndarray / float
+        """
+        return self._reduce( np.sum, axis, dtype=dtype )
+
+    def max( self, axis=None ):
+        """
+        Computes the maximum over the given axes blockwise.
+        """
+        return self._reduce( np.max, axis )
+
+    def min( self, axis=None ):
+        """
+        Computes the minimum over the given axes blockwise.
+        """
+        return self._reduce( np.min, axis )
+
+    def mean( self, axis=None ):
+        """
+        Computes the mean over the given axes blockwise (accumulated in float64).
+        """
+        axes = tuple( range( 3 ) ) if axis is None else tuple( np.atleast_1d( axis ) % 3 )
+        count = np.prod( [ self.shape[a] for a in axes ] )
+        return self.sum( axis=axis, dtype=np.float64 ) / count
@@ -72,9 +72,10 @@ class lazy_file_header_list:
         file_no, file_step = self._valid_steps[ index, : ]
         self._data[ file_no ][ file_step ] = value
 
-    # delete an item (e.g. when removing bad images after cropping)    
-    # this is done automatically, since _valid_steps is passed by reference!    
-    # def __delitem__( self, index )
+    # update the valid steps (e.g. when removing bad images after cropping),
+    # headers of files that are already loaded are kept
+    def set_valid_steps( self, valid_steps ):
+        self._valid_steps = valid_steps
 
     # convert representation into a regular python list (will load everything)
     def tolist( self ):
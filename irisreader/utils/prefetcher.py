@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""
+prefetcher class: reads image steps ahead on a background thread when a data
+cube is accessed sequentially with get_image_step
+"""
+
+import weakref
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import irisreader as ir
+
+class prefetcher:
+    """
+    This class detects sequential access to the image steps of a data cube and
+    then loads the next image steps on a background thread into a bounded
+    frame store. Frames are stored uncropped and keyed on (file number, file
+    step), such that cropping or removing steps from the data cube does not
+    invalidate them. Reading ahead crosses file boundaries, i.e. the next
+    raster files are opened in the background as well.
+    
+    The prefetcher only holds a weak reference to the data cube: if the data
+    cube is dropped without being closed, the prefetcher is released as well
+    and its background thread is shut down.
+
+    Parameters
+    ----------
+    data_cube : iris_data_cube
+        Data cube to prefetch image steps for.
+    n_steps : int
+        Number of image steps to read ahead. At most 2*n_steps frames are kept.
+    """
+
+    # constructor
+    def __init__( self, data_cube, n_steps ):
+        self._data_cube = weakref.proxy( data_cube )
+        self._n_steps = n_steps
+        self._capacity = 2 * n_steps
+        self._frames = OrderedDict()
+        self._pending = set()
+        self._last_request = None
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._executor = ThreadPoolExecutor( max_workers=1 )
+        self._finalizer = weakref.finalize( self, self._executor.shutdown, wait=False )
+
+    # function to get a frame (and trigger reading ahead if access is sequential)
+    def get( self, step, raster_pos, file_no, file_step ):
+        """
+        Returns the prefetched frame for the given file step (or None if it is
+        not available) and starts to read ahead if the image steps are
+        requested sequentially.
+
+        Parameters
+        ----------
+        step : int
+            Requested time step in the data cube (on the given raster position).
+        raster_pos : int
+            Raster position the step refers to (or None).
+        file_no : int
+            File number of the requested step.
+        file_step : int
+            Step in the file of the requested step.
+
+        Returns
+        -------
+        numpy.ndarray :
+            Uncropped frame or None.
+        """
+
+        with self._lock:
+            frame = self._frames.get( (file_no, file_step) )
+            if frame is not None:
+                self._frames.move_to_end( (file_no, file_step) )
+
+            # read ahead if the previous request was for the step just before this one
+            sequential = self._last_request == ( step - 1, raster_pos )
+            self._last_request = ( step, raster_pos )
+
+        if sequential:
+            self._schedule( step, raster_pos )
+
+        return frame
+
+    # function to schedule the next image steps for reading in the background
+    def _schedule( self, step, raster_pos ):
+
+        # get the file numbers and file steps of the next steps (on the raster position)
+        if raster_pos is None:
+            next_steps = self._data_cube._valid_steps[ step+1:step+1+self._n_steps, :2 ]
+        else:
+            next_steps = self._data_cube._valid_steps[ self._data_cube._get_raster_pos_index( raster_pos )[ step+1:step+1+self._n_steps ], :2 ]
+
+        with self._lock:
+            keys = [ key for key in map( tuple, next_steps.tolist() ) if key not in self._frames and key not in self._pending ]
+            self._pending.update( keys )
+
+        if len( keys ) > 0:
+            if ir.config.verbosity_level >= 3: print("[prefetcher] Reading ahead {} image steps".format( len( keys ) ) )
+            future = self._executor.submit( self._load, keys )
+            with self._lock:
+                self._futures.add( future )
+            future.add_done_callback( self._discard_future )
+
+    # function to forget about a finished read
+    def _discard_future( self, future ):
+        with self._lock:
+            self._futures.discard( future )
+
+    # function to load frames in the background
+    def _load( self, keys ):
+        data_cube = self._data_cube
+        keys = np.array( keys, dtype=int )
+        try:
+            for file_no in np.unique( keys[:,0] ):
+                file_steps = keys[ keys[:,0] == file_no, 1 ]
+                
+                # read through the frame cache if it is enabled (section reads that never load a whole file)
+                if ir.frame_cache.enabled:
+                    frames = data_cube._read_cached_file_steps( file_no, file_steps )
+                else:
+                    with ir.file_hub.checked_out( data_cube._files[file_no] ) as file:
+                        frames = data_cube._read_file_steps( file[data_cube._selected_ext], file_steps, slice( None ), slice( None ) )
+
+                with self._lock:
+                    for file_step, frame in zip( file_steps, frames ):
+                        self._frames[ ( int( file_no ), int( file_step ) ) ] = frame
+                        self._pending.discard( ( int( file_no ), int( file_step ) ) )
+                    while len( self._frames ) > self._capacity:
+                        self._frames.popitem( last=False )
+
+        except Exception as e:
+            if ir.config.verbosity_level >= 2: print("[prefetcher] Could not read ahead ({})".format( e ) )
+
+        finally:
+            with self._lock:
+                self._pending.difference_update( map( tuple, keys.tolist() ) )
+
+    # function to stop reading ahead and release the frames
+    def close( self ):
+        """
+        Stops the background thread and releases all frames.
+        """
+        
+        # cancel the reads that have not started yet (shutdown only cancels them in Python >= 3.9)
+        with self._lock:
+            futures = list( self._futures )
+        for future in futures:
+            future.cancel()
+        self._finalizer()
+        
+        with self._lock:
+            self._frames.clear()
+            self._pending.clear()
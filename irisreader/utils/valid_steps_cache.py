@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+"""
+Cache backends for the valid image steps of iris_data_cube.
+
+The valid steps are cached per file: every entry holds the valid file steps
+together with their raster positions, the shape of the selected data extension
+and the result of the integrity check (an error message for corrupt files).
+Which backend is used is controlled through ir.config.valid_steps_cache.
+"""
+
+import os
+import json
+import sqlite3
+import warnings
+import numpy as np
+
+import irisreader as ir
+
+# function to create the cache backend that is selected in ir.config
+def get_valid_steps_cache():
+    """
+    Returns the valid steps cache backend selected with ir.config.valid_steps_cache.
+
+    Returns
+    -------
+    npy_valid_steps_cache / sqlite_valid_steps_cache / None :
+        Cache backend or None if caching is disabled.
+    """
+
+    if ir.config.valid_steps_cache is None:
+        return None
+    elif ir.config.valid_steps_cache == 'npy':
+        return npy_valid_steps_cache()
+    elif ir.config.valid_steps_cache == 'sqlite':
+        return sqlite_valid_steps_cache( ir.config.valid_steps_db_path )
+    else:
+        raise ValueError( "ir.config.valid_steps_cache should be either 'npy', 'sqlite' or None" )
+
+# function to create a cache entry
+def make_entry( steps, shape, error=None ):
+    """
+    Creates a cache entry for a single file.
+
+    Parameters
+    ----------
+    steps : numpy.ndarray
+        Array with shape (n,2) holding [file_step, raster_pos] of the valid steps
+    shape : tuple
+        Shape of the selected data extension (None if unknown)
+    error : str
+        Error message if the file is corrupt, None otherwise
+
+    Returns
+    -------
+    dict :
+        cache entry with keys 'steps', 'shape' and 'error'
+    """
+    return { 'steps': np.asarray( steps, dtype=int ).reshape(-1,2), 'shape': None if shape is None else tuple( shape ), 'error': error }
+
+# function to get the fingerprint of a file
+def file_fingerprint( path ):
+    """
+    Returns a fingerprint (real path, size, modification time in ns) of a file.
+    """
+    stat = os.stat( path )
+    return os.path.realpath( path ), stat.st_size, stat.st_mtime_ns
+
+
+class npy_valid_steps_cache:
+    """
+    Cache backend that stores the valid steps of all files of a data cube in a
+    file .valid_steps_<variant>.npz in the directory of the first FITS file.
+    Every file is stored with a fingerprint (file name, size and modification
+    time), such that only files that changed or were added since the last
+    scan have to be assessed again. The integrity result and the shape of
+    every file are stored as well.
+    """
+
+    def _get_path( self, files, variant ):
+        return "{}/.valid_steps_{}.npz".format( os.path.dirname( files[0] ), variant )
+
+    def load( self, files, variant ):
+        """
+        Loads the cache entries for the given files.
+
+        Parameters
+        ----------
+        files : list
+            List of FITS file paths
+        variant : str
+            Identifier of the line and null mode
+
+        Returns
+        -------
+        list :
+            List with a cache entry (or None if not cached or stale) per file
+        """
+        entries = [None] * len( files )
+        path = self._get_path( files, variant )
+        if not os.path.exists( path ):
+            return entries
+
+        try:
+            with np.load( path ) as cache:
+                names, sizes, mtimes = cache['names'].tolist(), cache['sizes'], cache['mtimes']
+                steps, counts, shapes, errors = cache['steps'], cache['counts'], cache['shapes'], cache['errors']
+        except Exception as e:
+            warnings.warn( "Could not load valid steps from {} ({})".format( path, e ) )
+            return entries
+
+        # find every file by name and reuse its entry if the fingerprint did not change
+        lookup = { name: i for i, name in enumerate( names ) }
+        offsets = np.concatenate( [ [0], np.cumsum( counts ) ] )
+        for file_no, file in enumerate( files ):
+            i = lookup.get( os.path.basename( file ) )
+            if i is None:
+                continue
+            stat = os.stat( file )
+            if sizes[i] == stat.st_size and mtimes[i] == stat.st_mtime_ns:
+                shape = None if shapes[i][0] < 0 else shapes[i].tolist()
+                error = None if errors[i] == '' else str( errors[i] )
+                entries[file_no] = make_entry( steps[offsets[i]:offsets[i+1]], shape, error )
+
+        if ir.config.verbosity_level >= 2: print("[iris_data_cube] using precomputed steps for {} of {} files".format( sum( entry is not None for entry in entries ), len( files ) ) )
+        return entries
+
+    def store( self, files, variant, entries ):
+        """
+        Stores the cache entries for the given files.
+
+        Parameters
+        ----------
+        files : list
+            List of FITS file paths
+        variant : str
+            Identifier of the line and null mode
+        entries : list
+            List with a cache entry per file
+        """
+        path = self._get_path( files, variant )
+        tmp_path = "{}.{}.tmp".format( path, os.getpid() )
+        try:
+            stats = [ os.stat( file ) for file in files ]
+            cache = {
+                'names': np.array( [ os.path.basename( file ) for file in files ] ),
+                'sizes': np.array( [ stat.st_size for stat in stats ], dtype=np.int64 ),
+                'mtimes': np.array( [ stat.st_mtime_ns for stat in stats ], dtype=np.int64 ),
+                'steps': np.concatenate( [ entry['steps'] for entry in entries ] ).reshape(-1,2),
+                'counts': np.array( [ len( entry['steps'] ) for entry in entries ], dtype=np.int64 ),
+                'shapes': np.array( [ (-1,-1,-1) if entry['shape'] is None or len( entry['shape'] ) != 3 else entry['shape'] for entry in entries ], dtype=np.int64 ),
+                'errors': np.array( [ '' if entry['error'] is None else entry['error'] for entry in entries ] )
+            }
+
+            # write to a temporary file first, such that concurrent readers never see a partial cache
+            with open( tmp_path, 'wb' ) as f:
+                np.savez( f, **cache )
+            os.replace( tmp_path, path )
+
+        except Exception as e:
+            if os.path.exists( tmp_path ):
+                os.remove( tmp_path )
+            warnings.warn( "Could not store valid steps ({})".format( e ) )
+
+
+class sqlite_valid_steps_cache:
+    """
+    Cache backend that stores the valid steps of all files in one central SQLite
+    index. Entries are keyed on the real path of the file and invalidated when
+    the size or the modification time of the file changes. If the index is not
+    writable (e.g. on a shared read-only archive), it is only read.
+
+    Parameters
+    ----------
+    db_path : str
+        Path to the SQLite index file
+    """
+
+    def __init__( self, db_path ):
+        self.db_path = os.path.expanduser( db_path )
+
+    # connect to the index (read-only if it cannot be written)
+    def _connect( self, write=False ):
+        if write:
+            db_dir = os.path.dirname( self.db_path )
+            if db_dir != '' and not os.path.exists( db_dir ):
+                os.makedirs( db_dir, exist_ok=True )
+            connection = sqlite3.connect( self.db_path, timeout=30 )
+            connection.execute( """CREATE TABLE IF NOT EXISTS valid_steps (
+                                       path TEXT, variant TEXT, size INTEGER, mtime_ns INTEGER,
+                                       shape TEXT, error TEXT, steps BLOB, PRIMARY KEY (path, variant) )""" )
+        else:
+            connection = sqlite3.connect( "file:{}?mode=ro".format( self.db_path ), uri=True, timeout=30 )
+        return connection
+
+    def load( self, files, variant ):
+        """
+        Loads the cache entries for the given files.
+
+        Parameters
+        ----------
+        files : list
+            List of FITS file paths
+        variant : str
+            Identifier of the line and null mode
+
+        Returns
+        -------
+        list :
+            List with a cache entry (or None if not cached or stale) per file
+        """
+        entries = [None] * len( files )
+        if not os.path.exists( self.db_path ):
+            return entries
+
+        try:
+            connection = self._connect()
+            try:
+                for file_no, file in enumerate( files ):
+                    path, size, mtime_ns = file_fingerprint( file )
+                    row = connection.execute( "SELECT size, mtime_ns, shape, error, steps FROM valid_steps WHERE path=? AND variant=?", (path, variant) ).fetchone()
+                    if row is not None and row[0] == size and row[1] == mtime_ns:
+                        entries[file_no] = make_entry( np.frombuffer( row[4], dtype=np.int64 ), json.loads( row[2] ), row[3] )
+            finally:
+                connection.close()
+
+        except (sqlite3.Error, OSError) as e:
+            warnings.warn( "Could not read valid steps index {} ({})".format( self.db_path, e ) )
+
+        if ir.config.verbosity_level >= 2: print("[iris_data_cube] {} of {} files found in valid steps index".format( sum( entry is not None for entry in entries ), len( files ) ) )
+        return entries
+
+    def store( self, files, variant, entries ):
+        """
+        Stores the cache entries for the given files.
+
+        Parameters
+        ----------
+        files : list
+            List of FITS file paths
+        variant : str
+            Identifier of the line and null mode
+        entries : list
+            List with a cache entry per file
+        """
+        try:
+            rows = []
+            for file, entry in zip( files, entries ):
+                path, size, mtime_ns = file_fingerprint( file )
+                rows.append( (path, variant, size, mtime_ns, json.dumps( entry['shape'] ), entry['error'], entry['steps'].astype( np.int64 ).tobytes()) )
+
+            connection = self._connect( write=True )
+            try:
+                with connection:
+                    connection.executemany( "INSERT OR REPLACE INTO valid_steps VALUES (?,?,?,?,?,?,?)", rows )
+            finally:
+                connection.close()
+
+        except (sqlite3.Error, OSError) as e:
+            if ir.config.verbosity_level >= 2: print( "[iris_data_cube] Could not write to valid steps index {} ({})".format( self.db_path, e ) )